@@ -0,0 +1,174 @@
+from datetime import datetime
+
+from pareto import TOP_N_GRAFICOS, calcular_pareto, ordenar_por_valor, truncar_top_n
+from ventanas import truncar
+
+# --- AGREGACIÓN EN MONGO ---
+# El dashboard y el PDF solo necesitan totales por producto, por día y globales.
+# En vez de traer toda la colección a Python, Mongo agrupa y devuelve unas
+# pocas decenas de filas en una sola consulta ($match + $facet).
+# El $match es un rango sobre 'fecha' (ver ventanas.py) que usa su índice.
+
+def _periodo(granularidad):
+    if granularidad == 'dia':
+        return {'$dateToString': {'format': '%Y-%m-%d', 'date': '$fecha'}}
+    # Semanas (desde el lunes) y meses: requiere MongoDB 5.0
+    truncado = {'date': '$fecha', 'unit': 'week' if granularidad == 'semana' else 'month'}
+    if granularidad == 'semana':
+        truncado['startOfWeek'] = 'monday'
+    return {'$dateTrunc': truncado}
+
+def pipeline_resumen(match, granularidad='dia'):
+    return [
+        {'$match': match},
+        {'$facet': {
+            'por_producto': [
+                {'$group': {'_id': '$producto',
+                            'cantidad': {'$sum': '$cantidad'},
+                            'ingresos': {'$sum': '$ingresos'}}},
+            ],
+            'por_dia': [
+                {'$group': {'_id': _periodo(granularidad),
+                            'ingresos': {'$sum': '$ingresos'}}},
+                {'$sort': {'_id': 1}},
+            ],
+            'global': [
+                {'$group': {'_id': None,
+                            'ventas': {'$sum': 1},
+                            'ingresos': {'$sum': '$ingresos'}}},
+            ],
+        }},
+    ]
+
+def resumen_ventas(collection, match=None, granularidad='dia'):
+    resultado = next(collection.aggregate(pipeline_resumen(match or {}, granularidad)), None)
+    resumen = ResumenVentas.desde_agregacion(resultado or {})
+    resumen.granularidad = granularidad
+    return resumen
+
+def serie_producto(collection, nombre, match=None):
+    # Ingresos y unidades por día de un producto (índice producto+fecha);
+    # match: filtro de ventana opcional (ver ventanas.py)
+    return list(collection.aggregate([
+        {'$match': dict(match or {}, producto=nombre)},
+        {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$fecha'}},
+                    'ingresos': {'$sum': '$ingresos'},
+                    'cantidad': {'$sum': '$cantidad'}}},
+        {'$sort': {'_id': 1}},
+    ]))
+
+def productos_existentes(collection):
+    # Lista completa (sin filtro) para que los colores no cambien al filtrar
+    return sorted(p for p in collection.distinct('producto') if p is not None)
+
+
+# --- RESUMEN REUTILIZABLE ---
+# Todos los KPIs y series de gráficos salen de estos tres acumuladores, que se
+# rellenan una sola vez (desde Mongo o con una única pasada sobre las filas).
+
+class ResumenVentas:
+
+    def __init__(self):
+        self.cantidad = {}       # producto -> unidades
+        self.ingresos = {}       # producto -> ingresos
+        self.ingresos_dia = {}   # date (inicio del periodo) -> ingresos
+        self.granularidad = 'dia'
+        self.total_ventas = 0
+        self.total_ingresos = 0
+
+    @classmethod
+    def desde_filas(cls, ventas):
+        r = cls()
+        cantidad, ingresos, ingresos_dia = r.cantidad, r.ingresos, r.ingresos_dia
+        hoy = datetime.now().date()
+        for v in ventas:
+            prod = v['producto']
+            cantidad[prod] = cantidad.get(prod, 0) + v['cantidad']
+            ingresos[prod] = ingresos.get(prod, 0) + v['ingresos']
+            fecha = v.get('fecha')
+            dia = fecha.date() if fecha else hoy
+            ingresos_dia[dia] = ingresos_dia.get(dia, 0) + v['ingresos']
+            r.total_ventas += 1
+            r.total_ingresos += v['ingresos']
+        return r
+
+    @classmethod
+    def desde_agregacion(cls, resultado):
+        r = cls()
+        for fila in resultado.get('por_producto', []):
+            r.cantidad[fila['_id']] = fila['cantidad']
+            r.ingresos[fila['_id']] = fila['ingresos']
+        for fila in resultado.get('por_dia', []):
+            # Texto con $dateToString, fecha con $dateTrunc
+            periodo = fila['_id']
+            dia = periodo.date() if isinstance(periodo, datetime) else datetime.strptime(periodo, '%Y-%m-%d').date()
+            r.ingresos_dia[dia] = fila['ingresos']
+        if resultado.get('global'):
+            r.total_ventas = resultado['global'][0]['ventas']
+            r.total_ingresos = resultado['global'][0]['ingresos']
+        return r
+
+    @classmethod
+    def desde_materializado(cls, docs):
+        # Documentos de 'ventas_resumen' (ver resumen_materializado.py)
+        r = cls()
+        for doc in docs:
+            if doc['tipo'] == 'producto':
+                r.cantidad[doc['clave']] = doc['cantidad']
+                r.ingresos[doc['clave']] = doc['ingresos']
+            elif doc['tipo'] == 'dia':
+                r.ingresos_dia[datetime.strptime(doc['clave'], '%Y-%m-%d').date()] = doc['ingresos']
+            elif doc['tipo'] == 'global':
+                r.total_ventas = doc['ventas']
+                r.total_ingresos = doc['ingresos']
+        return r
+
+    def kpis(self):
+        if not self.total_ventas: return None
+        ticket_medio = self.total_ingresos / self.total_ventas
+        top_producto = max(self.ingresos, key=self.ingresos.get)
+        return {
+            "total_ingresos": f"{self.total_ingresos:,.2f}",
+            "ticket_medio": f"{ticket_medio:,.2f}",
+            "top_producto": top_producto
+        }
+
+    def tarta(self):
+        lista_ordenada = truncar_top_n(ordenar_por_valor(self.ingresos), 5)
+        return [x[0] for x in lista_ordenada], [x[1] for x in lista_ordenada]
+
+    def barras(self, orden='cantidad', top_n=TOP_N_GRAFICOS):
+        if orden == 'ingresos':
+            clave = lambda item: self.ingresos.get(item[0], 0)
+        else:
+            clave = lambda item: item[1]
+        lista_ordenada = sorted(self.cantidad.items(), key=clave, reverse=True)
+        if top_n is not None:
+            lista_ordenada = truncar_top_n(lista_ordenada, top_n)
+        return [x[0] for x in lista_ordenada], [x[1] for x in lista_ordenada]
+
+    def pareto(self, top_n=TOP_N_GRAFICOS):
+        # dict de calcular_pareto: productos, ingresos, acumulado y corte
+        return calcular_pareto(self.ingresos, top_n=top_n)
+
+    def dias_cubiertos(self):
+        if not self.ingresos_dia:
+            return 0
+        return (max(self.ingresos_dia) - min(self.ingresos_dia)).days + 1
+
+    def reagrupar(self, granularidad):
+        # Pasa la serie temporal a semanas o meses (p. ej. desde los contadores
+        # diarios del resumen materializado)
+        if granularidad != self.granularidad:
+            agrupado = {}
+            for dia, ingresos in self.ingresos_dia.items():
+                periodo = truncar(dia, granularidad)
+                agrupado[periodo] = agrupado.get(periodo, 0) + ingresos
+            self.ingresos_dia = agrupado
+            self.granularidad = granularidad
+        return self
+
+    def timeline(self):
+        # Solo se ordenan los días, no las ventas
+        fechas_ord = sorted(self.ingresos_dia)
+        return fechas_ord, [self.ingresos_dia[d] for d in fechas_ord]
@@ -1,51 +1,79 @@
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import io
-import base64
-import os
+import hashlib
 import json
+import os
 import subprocess
-from datetime import datetime, timedelta
+import threading
+import time
+import traceback
+from datetime import datetime
+from itertools import chain
 
-# --- AQUÍ ESTABA EL ERROR ---
-# Tienes que asegurarte de que 'send_file' esté en esta lista:
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
+import click
+from flask import Blueprint, Flask, Response, abort, render_template, request, redirect, url_for, flash, jsonify
+from werkzeug.local import LocalProxy
 
-# Y también asegurarte de que tienes esto para el PDF:
-from matplotlib.backends.backend_pdf import PdfPages
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-from bson import json_util
-
-app = Flask(__name__)
-app.secret_key = 'super_secret_key'
+from pymongo.errors import PyMongoError
+
+import backup
+import backup_incremental
+import cambios
+import conexion
+import escrituras
+import ingesta
+import metricas
+import resumen_materializado
+import tareas
+from ventanas import Ventana, VentanaInvalida, granularidad_para
+from agregados import resumen_ventas, productos_existentes, serie_producto
+from consultas import CAMPOS_DETALLE, CAMPOS_LISTADO, ensure_indexes, pagina_ventas, tamano_pagina
+from cache_graficos import CacheGraficos, estado_datos, incrementar_version
+from graficos import (pdf_en_streaming, renderizar_grafico, specs_detalle, specs_informe,
+                      spec_barras, spec_pareto, spec_producto, spec_tarta, spec_timeline)
+from metricas import etapa
+
+# Las rutas y comandos se registran en el blueprint; la app la monta create_app()
+panel = Blueprint('panel', __name__, cli_group=None)
 
 # --- CONFIGURACIÓN ---
-MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URI)
-db = client['mi_negocio']
-collection = db['ventas']
-BACKUP_FILE = 'datos_backup.json'
-
-# --- FUNCIONES AUXILIARES (BACKUP Y GIT - SIN CAMBIOS) ---
-def cargar_datos_desde_json():
-    if os.path.exists(BACKUP_FILE):
-        try:
-            with open(BACKUP_FILE, 'r') as file:
-                data = json.load(file, object_hook=json_util.object_hook)
-                if data:
-                    collection.insert_many(data)
-                    print(f"--- DATOS RESTAURADOS DESDE {BACKUP_FILE} ---")
-        except Exception as e:
-            print(f"Error cargando JSON: {e}")
+# El cliente de Mongo se abre en el primer uso dentro de cada proceso (ver conexion.py)
+db = LocalProxy(conexion.obtener_db)
+collection = LocalProxy(lambda: conexion.obtener_db()['ventas'])
+# Snapshots completos de versiones anteriores (solo lectura, ver backup_incremental.py)
+BACKUP_FILE = 'datos_backup.ndjson.gz'
+BACKUP_FILE_ANTIGUO = 'datos_backup.json'
+
+cache_graficos = CacheGraficos(
+    max_entradas=int(os.environ.get('CACHE_GRAFICOS_MAX', 256)),
+    ttl=int(os.environ.get('CACHE_GRAFICOS_TTL', 300)))
+
+# 'mongo' (por defecto) agrega en la base de datos; 'columnar' usa la copia en
+# memoria de columnar.py (más RAM por proceso, agregaciones sin ir a Mongo)
+FUENTE_ANALITICA = os.environ.get('FUENTE_ANALITICA', 'mongo')
+
+# --- FUNCIONES AUXILIARES (BACKUP Y GIT) ---
+def cargar_datos_desde_backup():
+    try:
+        # 1. Backup incremental (base + segmentos)
+        restaurado = backup_incremental.restaurar(db)
+        if restaurado:
+            print(f"--- DATOS RESTAURADOS DESDE {backup_incremental.DIRECTORIO} "
+                  f"({restaurado[0]} base + {restaurado[1]} cambios) ---")
+        else:
+            # 2. Snapshots completos de versiones anteriores
+            ruta = next((r for r in (BACKUP_FILE, BACKUP_FILE_ANTIGUO) if os.path.exists(r)), None)
+            if not ruta or not backup.importar(collection, ruta):
+                return
+            print(f"--- DATOS RESTAURADOS DESDE {ruta} ---")
+        resumen_materializado.reconstruir(db)
+        incrementar_version(db)
+    except Exception as e:
+        print(f"Error cargando backup: {e}")
 
-def guardar_datos_en_json():
-    datos = list(collection.find())
-    with open(BACKUP_FILE, 'w') as file:
-        json.dump(datos, file, default=json_util.default, indent=4)
-    print("--- BACKUP JSON CREADO ---")
+def guardar_datos_en_backup():
+    mensaje = backup_incremental.sincronizar(db)
+    print(f"--- BACKUP: {mensaje} ---")
+    return mensaje
 
 def ejecutar_git_push():
     usuario = os.environ.get('GITHUB_USER')
@@ -82,448 +110,474 @@ def ejecutar_git_push():
     except Exception as e:
         return False, str(e)
 
-def fig_to_base64(fig):
-    img = io.BytesIO()
-    plt.savefig(img, format='png', bbox_inches='tight')
-    img.seek(0)
-    data = base64.b64encode(img.getvalue()).decode()
-    plt.close(fig)
-    return data
-
-# --- LÓGICA DE NEGOCIO ---
-
-def obtener_kpis(ventas):
-    if not ventas: return None
-    total_ingresos = sum(d['ingresos'] for d in ventas)
-    ticket_medio = total_ingresos / len(ventas)
-    prod_ingresos = {}
-    for v in ventas:
-        prod_ingresos[v['producto']] = prod_ingresos.get(v['producto'], 0) + v['ingresos']
-    top_producto = max(prod_ingresos, key=prod_ingresos.get)
-    return {
-        "total_ingresos": f"{total_ingresos:,.2f}",
-        "ticket_medio": f"{ticket_medio:,.2f}",
-        "top_producto": top_producto
-    }
+MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
 
-def preparar_datos_tarta(ventas):
-    agrupado = {}
-    for v in ventas:
-        prod = v['producto']
-        agrupado[prod] = agrupado.get(prod, 0) + v['ingresos']
-    lista_ordenada = sorted(agrupado.items(), key=lambda x: x[1], reverse=True)
-    
-    if len(lista_ordenada) > 5:
-        top_5 = lista_ordenada[:5]
-        otros_valor = sum(item[1] for item in lista_ordenada[5:])
-        top_5.append(('Otros', otros_valor))
-        labels = [x[0] for x in top_5]
-        values = [x[1] for x in top_5]
+def ventana_de_peticion():
+    try:
+        return Ventana.desde_args(request.args)
+    except VentanaInvalida as e:
+        abort(400, str(e))
+
+def obtener_resumen(ventana, granularidad='auto'):
+    # Sin filtro de tiempo basta con el resumen materializado (O(productos + días));
+    # con ventana se agregan en Mongo solo las ventas del rango
+    unidad = ventana.granularidad(granularidad)
+    if FUENTE_ANALITICA == 'columnar':
+        import columnar
+        resumen = columnar.obtener(db).resumen_actualizado(db, ventana.inicio, ventana.fin)
+    elif ventana.es_todo():
+        resumen = resumen_materializado.leer_resumen(db)
     else:
-        labels = [x[0] for x in lista_ordenada]
-        values = [x[1] for x in lista_ordenada]
-    return labels, values
+        resumen = resumen_ventas(collection, ventana.filtro(), unidad or 'dia')
+    # En 'auto' sin rango conocido la escala sale de los propios datos
+    return resumen.reagrupar(unidad or granularidad_para(resumen.dias_cubiertos()))
 
 # --- RUTAS ---
-@app.route('/')
+@panel.route('/')
 def dashboard():
     # 1. Recuperar filtros
-    filtro_tiempo = request.args.get('tiempo', 'todo')
+    ventana = ventana_de_peticion()
     filtro_orden = request.args.get('orden', 'cantidad')
-
-    # 2. Obtener datos
-    todas_ventas = list(collection.find())
-    for v in todas_ventas:
-        if 'fecha' not in v: v['fecha'] = datetime.now()
-
-    # 3. Filtrado
-    if filtro_tiempo == '30dias':
-        fecha_corte = datetime.now() - timedelta(days=30)
-        ventas = [v for v in todas_ventas if v['fecha'] >= fecha_corte]
+    granularidad = request.args.get('granularidad', 'auto')
+    # modo=cliente: los gráficos los dibuja el navegador con /api/dashboard
+    modo = request.args.get('modo', 'servidor')
+    # Lo que se repite en las URLs de los gráficos y del PDF
+    parametros = dict(ventana.args(), granularidad=granularidad)
+    filtros = dict(filtro_tiempo=ventana.nombre, filtro_orden=filtro_orden, granularidad=granularidad,
+                   desde=request.args.get('desde', ''), hasta=request.args.get('hasta', ''),
+                   parametros=parametros, modo=modo)
+
+    # 2. Obtener datos ya agrupados (resumen materializado o agregación en Mongo)
+    with etapa('fetch'):
+        resumen = obtener_resumen(ventana, granularidad)
+
+    if not resumen.total_ventas:
+        with etapa('template'):
+            return render_template('dashboard.html', kpis=None, **filtros)
+
+    with etapa('aggregate'):
+        kpis = resumen.kpis()
+
+    # 3. La página sale ya; los gráficos los pide el navegador en paralelo
+    # a /chart/<tipo>.png (ver imagen_grafico)
+    with etapa('template'):
+        return render_template('dashboard.html', kpis=kpis, **filtros)
+
+def respuesta_cacheada(clave, actualizado, calcular, mimetype):
+    etag = hashlib.sha1(repr(clave).encode()).hexdigest()
+    # GET condicional: si el navegador ya lo tiene no se calcula nada
+    if etag in request.if_none_match or (
+            actualizado and request.if_modified_since
+            and actualizado.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)):
+        resp = Response(status=304)
     else:
-        ventas = todas_ventas
-
-    if not ventas:
-        return render_template('dashboard.html', kpis=None, 
-                               plot_barras=None, plot_tarta=None, 
-                               plot_pareto=None, plot_timeline=None,
-                               filtro_tiempo=filtro_tiempo, filtro_orden=filtro_orden)
-
-    kpis = obtener_kpis(ventas)
-    ventas_por_fecha = sorted(ventas, key=lambda x: x['fecha'])
-
-    # --- CONFIGURACIÓN VISUAL ---
-    plt.style.use('ggplot')
-    todos_productos = sorted(list(set(v['producto'] for v in todas_ventas)))
-    paleta = plt.cm.tab20(range(len(todos_productos)))
-    product_colors = {prod: paleta[i % 20] for i, prod in enumerate(todos_productos)}
-    product_colors['Otros'] = '#d3d3d3' 
-
-    # ==========================================
-    # GRÁFICO 1: BARRAS
-    # ==========================================
-    fig1, ax1 = plt.subplots(figsize=(6, 4))
-    
-    prod_cantidad = {}
-    prod_ingresos = {}
-    for v in ventas:
-        prod_cantidad[v['producto']] = prod_cantidad.get(v['producto'], 0) + v['cantidad']
-        prod_ingresos[v['producto']] = prod_ingresos.get(v['producto'], 0) + v['ingresos']
-    
-    if filtro_orden == 'ingresos':
-        lista_ordenada = sorted(prod_cantidad.items(), key=lambda item: prod_ingresos.get(item[0], 0), reverse=True)
-        titulo_barras = 'Unidades (Ordenado por Rentabilidad)'
-    else:
-        lista_ordenada = sorted(prod_cantidad.items(), key=lambda item: item[1], reverse=True)
-        titulo_barras = 'Unidades (Ordenado por Volumen)'
-
-    lista_prods = [x[0] for x in lista_ordenada]
-    lista_vals = [x[1] for x in lista_ordenada]
-    colores = [product_colors.get(p, '#333') for p in lista_prods]
-    
-    ax1.bar(lista_prods, lista_vals, color=colores)
-    ax1.set_title(titulo_barras, fontsize=10, weight='bold')
-    
-    # +++ ETIQUETAS AÑADIDAS +++
-    ax1.set_xlabel('Productos', fontsize=9, color='#555')
-    ax1.set_ylabel('Cantidad Vendida', fontsize=9, color='#555')
-    # ++++++++++++++++++++++++++
-    
-    ax1.tick_params(axis='x', rotation=45, labelsize=8)
-    plot_barras = fig_to_base64(fig1)
-
-    # ==========================================
-    # GRÁFICO 2: TARTA (Sin ejes X/Y)
-    # ==========================================
-    fig2, ax2 = plt.subplots(figsize=(6, 4))
-    labels_pie, values_pie = preparar_datos_tarta(ventas)
-    colores_pie = [product_colors.get(l, '#d3d3d3') for l in labels_pie]
-    explode = [0.1] + [0]*(len(values_pie)-1) if values_pie else None
-    
-    ax2.pie(values_pie, labels=labels_pie, autopct='%1.1f%%', startangle=140, 
-            explode=explode, shadow=True, colors=colores_pie)
-    ax2.set_title('Distribución Ingresos', fontsize=10, weight='bold')
-    plot_tarta = fig_to_base64(fig2)
-
-    # ==========================================
-    # GRÁFICO 3: PARETO
-    # ==========================================
-    fig3, ax3 = plt.subplots(figsize=(6, 4))
-    ingresos_por_prod = {}
-    for v in ventas:
-        ingresos_por_prod[v['producto']] = ingresos_por_prod.get(v['producto'], 0) + v['ingresos']
-    sorted_par = sorted(ingresos_por_prod.items(), key=lambda x: x[1], reverse=True)
-    prods_par = [x[0] for x in sorted_par]
-    ingr_par = [x[1] for x in sorted_par]
-    
-    colores_par = [product_colors.get(p, '#333') for p in prods_par]
-    total = sum(ingr_par)
-    acumulado = [sum(ingr_par[:i+1])/total*100 for i in range(len(ingr_par))]
-
-    ax3.bar(prods_par, ingr_par, color=colores_par)
-    
-    # +++ ETIQUETAS EJE PRIMARIO (Izquierda) +++
-    ax3.set_xlabel('Productos', fontsize=9, color='#555')
-    ax3.set_ylabel('Ingresos Totales (€)', fontsize=9, color='#555')
-    # ++++++++++++++++++++++++++++++++++++++++++
-
-    ax3_twin = ax3.twinx()
-    ax3_twin.plot(prods_par, acumulado, color='red', marker='o', linewidth=2)
-    ax3_twin.axhline(80, color='gray', linestyle='--')
-    
-    # +++ ETIQUETA EJE SECUNDARIO (Derecha) +++
-    ax3_twin.set_ylabel('% Acumulado', fontsize=9, color='red')
-    # +++++++++++++++++++++++++++++++++++++++++
-    
-    ax3.set_title('Pareto (80/20)', fontsize=10, weight='bold')
-    ax3.tick_params(axis='x', rotation=45, labelsize=8)
-    plot_pareto = fig_to_base64(fig3)
-
-    # ==========================================
-    # GRÁFICO 4: TIMELINE
-    # ==========================================
-    fig4, ax4 = plt.subplots(figsize=(6, 4))
-    fechas_map = {}
-    for v in ventas_por_fecha:
-        dia = v['fecha'].date()
-        fechas_map[dia] = fechas_map.get(dia, 0) + v['ingresos']
-    fechas_ord = sorted(fechas_map.keys())
-    vals_tiempo = [fechas_map[d] for d in fechas_ord]
-    
-    ax4.plot(fechas_ord, vals_tiempo, marker='o', linestyle='-', color='#2ca02c')
-    ax4.set_title('Tendencia Temporal', fontsize=10, weight='bold')
-    
-    # +++ ETIQUETAS AÑADIDAS +++
-    ax4.set_xlabel('Fecha de Venta', fontsize=9, color='#555')
-    ax4.set_ylabel('Facturación Diaria (€)', fontsize=9, color='#555')
-    # ++++++++++++++++++++++++++
-
-    ax4.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
-    ax4.tick_params(axis='x', rotation=45)
-    plot_timeline = fig_to_base64(fig4)
-
-    return render_template('dashboard.html', kpis=kpis, 
-                           plot_barras=plot_barras, 
-                           plot_tarta=plot_tarta, 
-                           plot_pareto=plot_pareto, 
-                           plot_timeline=plot_timeline,
-                           filtro_tiempo=filtro_tiempo,
-                           filtro_orden=filtro_orden)
-
-@app.route('/producto/<nombre>')
+        resp = Response(cache_graficos.obtener_o_calcular(clave, calcular), mimetype=mimetype)
+    resp.set_etag(etag)
+    if actualizado:
+        resp.last_modified = actualizado
+    resp.cache_control.no_cache = True
+    return resp
+
+@panel.route('/chart/<any(barras, tarta, pareto, timeline):tipo>.<any(png, svg):formato>')
+def imagen_grafico(tipo, formato):
+    ventana = ventana_de_peticion()
+    filtro_orden = request.args.get('orden', 'cantidad') if tipo == 'barras' else None
+    granularidad = request.args.get('granularidad', 'auto') if tipo == 'timeline' else None
+    version, actualizado = estado_datos(db)
+
+    # Con ventana relativa los datos cambian cada día aunque nadie escriba: la
+    # clave lleva los límites ya resueltos, pero Last-Modified no sirve
+    if ventana.relativa():
+        actualizado = None
+    clave = (tipo, ventana.clave(), filtro_orden, granularidad, None, version, formato)
+
+    def calcular():
+        with etapa('fetch'):
+            resumen = obtener_resumen(ventana, granularidad or 'dia')
+            paleta = productos_existentes(collection) if tipo != 'timeline' else None
+        with etapa('aggregate'):
+            if tipo == 'timeline':
+                spec = spec_timeline(resumen)
+            elif tipo == 'barras':
+                spec = spec_barras(resumen, filtro_orden, paleta)
+            elif tipo == 'tarta':
+                spec = spec_tarta(resumen, paleta)
+            else:
+                spec = spec_pareto(resumen, paleta)
+        # Se dibuja en un worker del pool: cada gráfico va en paralelo
+        with etapa(f'render:{tipo}'):
+            return renderizar_grafico(spec, formato)
+
+    return respuesta_cacheada(clave, actualizado, calcular, MIMETYPES[formato])
+
+@panel.route('/producto/<nombre>')
 def producto_detalle(nombre):
-    # 1. Buscamos en Mongo (ordenado por fecha descendente para la tabla)
-    ventas_prod = list(collection.find({'producto': nombre}).sort("fecha", -1))
+    # 1. KPIs desde el resumen materializado (no hace falta leer las ventas)
+    with etapa('fetch'):
+        totales = resumen_materializado.totales_producto(db, nombre)
     
-    if not ventas_prod:
+    if not totales:
         flash(f'No se encontraron datos para el producto "{nombre}".', 'warning')
-        return redirect(url_for('gestion'))
+        return redirect(url_for('.gestion'))
 
-    # 2. Calculamos KPIs
-    total_ingresos = sum(v['ingresos'] for v in ventas_prod)
-    total_unidades = sum(v['cantidad'] for v in ventas_prod)
+    # 2. Una página del historial (índice producto+fecha, solo los campos de la tabla)
+    with etapa('fetch'):
+        ventas_prod, siguiente = pagina_ventas(collection, {'producto': nombre}, CAMPOS_DETALLE,
+                                               request.args.get('despues'), tamano_pagina(request.args.get('n')))
 
-    # 3. GENERAR GRÁFICO ESPECÍFICO (Timeline del producto)
-    # Para el gráfico necesitamos orden ascendente (antiguo -> nuevo)
-    # ventas_prod está descendente, así que lo invertimos para pintar
-    ventas_grafico = ventas_prod[::-1] 
-    
-    fechas = [v['fecha'] for v in ventas_grafico]
-    ingresos = [v['ingresos'] for v in ventas_grafico]
-
-    plt.style.use('ggplot')
-    fig, ax = plt.subplots(figsize=(8, 4))
-    
-    # Pintamos línea y puntos
-    ax.plot(fechas, ingresos, marker='o', linestyle='-', color='#0d6efd', linewidth=2)
-    
-    ax.set_title(f'Evolución de Ventas: {nombre}', fontsize=12, weight='bold')
-    ax.set_ylabel('Ingresos (€)', fontsize=10)
-    ax.set_xlabel('Fecha', fontsize=10)
-    
-    # Formato de fechas en el eje X
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    ax.tick_params(axis='x', rotation=45, labelsize=8)
-    ax.grid(True, linestyle='--', alpha=0.6)
-    
-    # Convertir a Base64 (usamos la función auxiliar que ya tenías)
-    plot_url = fig_to_base64(fig)
+    # 3. El gráfico se sirve aparte en /producto/<nombre>/chart.png
 
     # 4. Renderizar
-    return render_template('detalle.html', 
-                           nombre=nombre, 
-                           ventas=ventas_prod,
-                           total_ingresos=total_ingresos,
-                           total_unidades=total_unidades,
-                           plot_url=plot_url) # <--- Pasamos el gráfico
-
+    with etapa('template'):
+        return render_template('detalle.html', 
+                               nombre=nombre, 
+                               modo=request.args.get('modo', 'servidor'),
+                               ventas=ventas_prod,
+                               siguiente=siguiente,
+                               total_ingresos=totales['ingresos'],
+                               total_unidades=totales['cantidad'])
+
+def ventas_producto(nombre):
+    # Serie completa del producto en orden ascendente, solo los campos del gráfico
+    return list(collection.find({'producto': nombre}, {'_id': 0, 'fecha': 1, 'ingresos': 1}).sort("fecha", 1))
+
+@panel.route('/producto/<nombre>/chart.<any(png, svg):formato>')
+def imagen_producto(nombre, formato):
+    version, actualizado = estado_datos(db)
+    clave = ('producto', None, None, None, nombre, version, formato)
+
+    def calcular():
+        with etapa('fetch'):
+            ventas_prod = ventas_producto(nombre)
+        if not ventas_prod:
+            abort(404)
+        with etapa('render:producto'):
+            return renderizar_grafico(spec_producto(nombre, ventas_prod), formato)
+
+    return respuesta_cacheada(clave, actualizado, calcular, MIMETYPES[formato])
+
+
+# --- API JSON (solo lectura) ---
+# Los mismos datos que los gráficos, para que los dibuje el cliente. Misma
+# caché y mismo GET condicional (ETag / Last-Modified) que las imágenes.
+
+def json_compacto(datos):
+    return json.dumps(datos, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+
+def _redondear(valores, decimales=2):
+    return [round(v, decimales) for v in valores]
+
+def datos_dashboard(resumen, ventana, filtro_orden, paleta):
+    if not resumen.total_ventas:
+        return {'ventana': ventana.args(), 'kpis': None}
+    productos, unidades = resumen.barras(filtro_orden)
+    etiquetas, valores = resumen.tarta()
+    pareto = resumen.pareto()
+    periodos, ingresos_periodo = resumen.timeline()
+    return {
+        'ventana': ventana.args(),
+        'kpis': {'total_ingresos': round(resumen.total_ingresos, 2),
+                 'ticket_medio': round(resumen.total_ingresos / resumen.total_ventas, 2),
+                 'top_producto': max(resumen.ingresos, key=resumen.ingresos.get),
+                 'total_ventas': resumen.total_ventas},
+        # Lista completa de productos para asignar siempre el mismo color
+        'paleta': paleta,
+        'barras': {'orden': filtro_orden, 'productos': productos, 'unidades': unidades},
+        'tarta': {'etiquetas': etiquetas, 'ingresos': _redondear(valores)},
+        'pareto': {'productos': pareto['productos'], 'ingresos': _redondear(pareto['ingresos']),
+                   'acumulado': _redondear(pareto['acumulado']), 'corte': pareto['corte']},
+        'timeline': {'granularidad': resumen.granularidad, 'periodos': periodos,
+                     'ingresos': _redondear(ingresos_periodo)},
+    }
 
-@app.route('/gestion')
+@panel.route('/api/dashboard')
+def api_dashboard():
+    ventana = ventana_de_peticion()
+    filtro_orden = request.args.get('orden', 'cantidad')
+    granularidad = request.args.get('granularidad', 'auto')
+    version, actualizado = estado_datos(db)
+    if ventana.relativa():
+        actualizado = None
+    clave = ('api_dashboard', ventana.clave(), filtro_orden, granularidad, None, version, 'json')
+
+    def calcular():
+        with etapa('fetch'):
+            resumen = obtener_resumen(ventana, granularidad)
+            paleta = productos_existentes(collection)
+        with etapa('aggregate'):
+            return json_compacto(datos_dashboard(resumen, ventana, filtro_orden, paleta))
+
+    return respuesta_cacheada(clave, actualizado, calcular, 'application/json')
+
+@panel.route('/api/producto/<nombre>')
+def api_producto(nombre):
+    version, actualizado = estado_datos(db)
+    clave = ('api_producto', None, None, None, nombre, version, 'json')
+
+    def calcular():
+        with etapa('fetch'):
+            totales = resumen_materializado.totales_producto(db, nombre)
+            if not totales:
+                abort(404)
+            serie = serie_producto(collection, nombre)
+        return json_compacto({
+            'nombre': nombre,
+            'ventas': totales['ventas'],
+            'unidades': totales['cantidad'],
+            'ingresos': round(totales['ingresos'], 2),
+            'serie': {'dias': [f['_id'] for f in serie],
+                      'ingresos': _redondear([f['ingresos'] for f in serie]),
+                      'unidades': [f['cantidad'] for f in serie]},
+        })
+
+    return respuesta_cacheada(clave, actualizado, calcular, 'application/json')
+
+@panel.route('/gestion')
 def gestion():
-    ventas = list(collection.find().sort("fecha", -1))
-    return render_template('gestion.html', ventas=ventas)
+    with etapa('fetch'):
+        ventas, siguiente = pagina_ventas(collection, None, CAMPOS_LISTADO,
+                                          request.args.get('despues'), tamano_pagina(request.args.get('n')))
+    with etapa('template'):
+        return render_template('gestion.html', ventas=ventas, siguiente=siguiente)
 
-@app.route('/agregar', methods=['POST'])
+@panel.route('/agregar', methods=['POST'])
 def agregar():
-    fecha_str = request.form['fecha']
     try:
-        fecha_obj = datetime.strptime(fecha_str, '%Y-%m-%d')
-    except ValueError:
-        fecha_obj = datetime.now()
-
-    nuevo_dato = {
-        "producto": request.form['producto'],
-        "cantidad": int(request.form['cantidad']),
-        "ingresos": float(request.form['ingresos']),
-        "fecha": fecha_obj
-    }
-    collection.insert_one(nuevo_dato)
-    return redirect(url_for('gestion'))
-
-@app.route('/eliminar/<id>')
+        nuevo_dato = escrituras.validar_venta(request.form, fecha_por_defecto=datetime.now())
+    except escrituras.VentaInvalida as e:
+        flash(f'Venta no guardada: {e}', 'danger')
+        return redirect(url_for('.gestion'))
+    escrituras.alta(db, nuevo_dato)
+    return redirect(url_for('.gestion'))
+
+@panel.route('/eliminar/<id>')
 def eliminar(id):
-    collection.delete_one({'_id': ObjectId(id)})
-    return redirect(url_for('gestion'))
+    escrituras.baja(db, id)
+    return redirect(url_for('.gestion'))
 
-@app.route('/editar/<id>')
+@panel.route('/editar/<id>')
 def editar(id):
     venta = collection.find_one({'_id': ObjectId(id)})
     return render_template('editar.html', venta=venta)
 
-@app.route('/actualizar/<id>', methods=['POST'])
+@panel.route('/actualizar/<id>', methods=['POST'])
 def actualizar(id):
-    fecha_str = request.form['fecha']
     try:
-        fecha_obj = datetime.strptime(fecha_str, '%Y-%m-%d')
-    except ValueError:
-        fecha_obj = datetime.now()
-
-    datos_actualizados = {
-        "producto": request.form['producto'],
-        "cantidad": int(request.form['cantidad']),
-        "ingresos": float(request.form['ingresos']),
-        "fecha": fecha_obj
-    }
-    collection.update_one({'_id': ObjectId(id)}, {'$set': datos_actualizados})
+        datos_actualizados = escrituras.validar_venta(request.form, fecha_por_defecto=datetime.now())
+    except escrituras.VentaInvalida as e:
+        flash(f'Registro no actualizado: {e}', 'danger')
+        return redirect(url_for('.gestion'))
+    escrituras.cambio(db, id, datos_actualizados)
     flash('Registro actualizado correctamente', 'success')
-    return redirect(url_for('gestion'))
+    return redirect(url_for('.gestion'))
+
+def tarea_sincronizar():
+    guardar_datos_en_backup()
+    return ejecutar_git_push()
 
-@app.route('/sincronizar')
+@panel.route('/sincronizar')
 def sincronizar():
-    guardar_datos_en_json()
-    exito, mensaje = ejecutar_git_push()
-    if exito:
-        flash(f'Éxito: {mensaje}', 'success')
+    # El backup y el push se hacen en segundo plano; varios clics seguidos
+    # se agrupan en una sola tarea pendiente
+    tarea_id, nueva = tareas.encolar(db, 'sincronizar')
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'id': str(tarea_id), 'nueva': nueva,
+                        'estado': url_for('.sincronizar_estado', tarea_id=str(tarea_id))}), 202
+    if nueva:
+        flash(f'Sincronización en marcha (tarea {tarea_id}).', 'info')
     else:
-        flash(f'Backup creado localmente, pero falló el Push: {mensaje}', 'warning')
-    return redirect(url_for('gestion'))
-
-@app.route('/reporte_pdf')
+        flash(f'Ya había una sincronización pendiente (tarea {tarea_id}); se incluirán tus cambios.', 'info')
+    return redirect(url_for('.gestion'))
+
+@panel.route('/sincronizar/estado/<tarea_id>')
+def sincronizar_estado(tarea_id):
+    tarea = tareas.consultar(db, tarea_id)
+    if not tarea:
+        abort(404)
+    return jsonify(tarea)
+
+@panel.route('/api/ventas/bulk', methods=['POST'])
+def ventas_bulk():
+    # Cuerpo en CSV (text/csv) o NDJSON (application/x-ndjson), leído en streaming
+    formato = request.args.get('formato') or ingesta.formato_desde_tipo(request.content_type)
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': f'Formato no soportado: {formato}'}), 400
+    lote = min(request.args.get('lote', ingesta.LOTE, type=int), ingesta.LOTE_MAXIMO)
+    informe = ingesta.importar(db, ingesta.leer_filas(request.stream, formato), max(lote, 1))
+    return jsonify(informe), 200 if informe['total_insertadas'] or not informe['total_errores'] else 400
+
+@panel.route('/cache/estadisticas')
+def cache_estadisticas():
+    return jsonify(cache_graficos.estadisticas())
+
+@panel.route('/healthz')
+def healthz():
+    # Vivo = el proceso responde. No depende de Mongo a propósito: si Mongo cae,
+    # reiniciar la app no lo arregla (eso lo indica /readyz)
+    return jsonify({'estado': 'ok', 'proceso': os.getpid()})
+
+@panel.route('/readyz')
+def readyz():
+    # Lista = puede atender peticiones: el arranque del proceso ha terminado y
+    # hay un servidor de Mongo que responde
+    if _arranque['pendiente']:
+        return jsonify({'estado': 'arrancando', 'intentos': _arranque['intentos'],
+                        'error': _arranque['error']}), 503
+    inicio = time.perf_counter()
+    try:
+        conexion.ping()
+    except Exception as e:
+        return jsonify({'estado': 'no_lista', 'mongo': str(e)}), 503
+    return jsonify({'estado': 'lista', 'mongo_ms': round((time.perf_counter() - inicio) * 1000, 1)})
+
+@panel.route('/metrics')
+def metrics():
+    # Histogramas de latencia por ruta y por etapa + estado de la caché de
+    # gráficos, en formato de texto de Prometheus
+    cache = cache_graficos.estadisticas()
+    extra = ["# TYPE app_cache_graficos_aciertos_total counter",
+             f"app_cache_graficos_aciertos_total {cache['aciertos']}",
+             "# TYPE app_cache_graficos_fallos_total counter",
+             f"app_cache_graficos_fallos_total {cache['fallos']}",
+             "# TYPE app_cache_graficos_entradas gauge",
+             f"app_cache_graficos_entradas {cache['entradas']}"]
+    pool = conexion.estado_pool()
+    if pool:
+        extra += ["# TYPE app_mongo_conexiones_abiertas gauge",
+                  f"app_mongo_conexiones_abiertas {pool[0]}",
+                  "# TYPE app_mongo_conexiones_en_uso gauge",
+                  f"app_mongo_conexiones_en_uso {pool[1]}"]
+    return Response(metricas.exportar_prometheus(extra), mimetype='text/plain; version=0.0.4')
+
+@panel.route('/reporte_pdf')
 def reporte_pdf():
     # 1. Recuperar filtros (para que el PDF coincida con lo que ves en pantalla)
-    filtro_tiempo = request.args.get('tiempo', 'todo')
+    ventana = ventana_de_peticion()
     filtro_orden = request.args.get('orden', 'cantidad')
 
-    # 2. Obtener y Filtrar Datos (Igual que en dashboard)
-    todas_ventas = list(collection.find())
-    for v in todas_ventas:
-        if 'fecha' not in v: v['fecha'] = datetime.now()
-
-    if filtro_tiempo == '30dias':
-        fecha_corte = datetime.now() - timedelta(days=30)
-        ventas = [v for v in todas_ventas if v['fecha'] >= fecha_corte]
-    else:
-        ventas = todas_ventas
+    # 2. Obtener datos agrupados (misma agregación que el dashboard)
+    with etapa('fetch'):
+        resumen = obtener_resumen(ventana, request.args.get('granularidad', 'auto'))
 
-    if not ventas:
+    if not resumen.total_ventas:
         flash("No hay datos para generar el PDF", "warning")
-        return redirect(url_for('dashboard'))
-
-    # 3. Preparar Datos y Colores
-    kpis = obtener_kpis(ventas)
-    ventas_por_fecha = sorted(ventas, key=lambda x: x['fecha'])
-    
-    plt.style.use('ggplot')
-    todos_productos = sorted(list(set(v['producto'] for v in todas_ventas)))
-    paleta = plt.cm.tab20(range(len(todos_productos)))
-    product_colors = {prod: paleta[i % 20] for i, prod in enumerate(todos_productos)}
-    product_colors['Otros'] = '#d3d3d3'
-
-    # 4. CREAR EL PDF EN MEMORIA
-    buffer = io.BytesIO()
-    
-    with PdfPages(buffer) as pdf:
-        
-        # --- PÁGINA 1: PORTADA Y KPIs ---
-        fig_portada = plt.figure(figsize=(8.5, 11)) # Tamaño Carta/A4 aprox
-        fig_portada.clf()
-        
-        # Título
-        txt_titulo = f"Informe de Ventas\nGenerated by Docker & Python"
-        fig_portada.text(0.5, 0.9, txt_titulo, ha='center', fontsize=24, weight='bold', color='#333')
-        
-        # Fecha de emisión
-        fig_portada.text(0.5, 0.85, f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}", ha='center', fontsize=12, color='#666')
-        
-        # KPIs en texto grande
-        y_pos = 0.7
-        fig_portada.text(0.5, y_pos, "RESUMEN EJECUTIVO", ha='center', fontsize=16, weight='bold', color='#0d6efd')
-        
-        metrics = [
-            f"Ingresos Totales: {kpis['total_ingresos']} €",
-            f"Ticket Medio: {kpis['ticket_medio']} €",
-            f"Producto Top: {kpis['top_producto']}",
-            f"Total Ventas Registradas: {len(ventas)}"
-        ]
-        
-        for i, metric in enumerate(metrics):
-            fig_portada.text(0.5, y_pos - 0.1 - (i*0.05), metric, ha='center', fontsize=14)
-
-        # Nota de filtros
-        fig_portada.text(0.5, 0.4, f"Filtros aplicados: Tiempo={filtro_tiempo} | Orden={filtro_orden}", 
-                         ha='center', fontsize=10, style='italic', color='gray')
-
-        pdf.savefig(fig_portada)
-        plt.close()
-
-        # --- PÁGINA 2: GRÁFICOS DE BARRAS Y TARTA ---
-        fig_pg2, (ax1, ax2) = plt.subplots(2, 1, figsize=(8.5, 11))
-        
-        # Barras (Reutilizamos lógica)
-        prod_cantidad = {}
-        prod_ingresos = {}
-        for v in ventas:
-            prod_cantidad[v['producto']] = prod_cantidad.get(v['producto'], 0) + v['cantidad']
-            prod_ingresos[v['producto']] = prod_ingresos.get(v['producto'], 0) + v['ingresos']
-        
-        if filtro_orden == 'ingresos':
-            lista_ordenada = sorted(prod_cantidad.items(), key=lambda item: prod_ingresos.get(item[0], 0), reverse=True)
-            titulo_barras = 'Unidades (Por Rentabilidad)'
-        else:
-            lista_ordenada = sorted(prod_cantidad.items(), key=lambda item: item[1], reverse=True)
-            titulo_barras = 'Unidades (Por Volumen)'
-
-        list_p = [x[0] for x in lista_ordenada]
-        list_v = [x[1] for x in lista_ordenada]
-        cols = [product_colors.get(p, '#333') for p in list_p]
-        
-        ax1.bar(list_p, list_v, color=cols)
-        ax1.set_title(titulo_barras)
-        ax1.tick_params(axis='x', rotation=45, labelsize=8)
-        
-        # Tarta
-        labels_pie, values_pie = preparar_datos_tarta(ventas)
-        cols_pie = [product_colors.get(l, '#d3d3d3') for l in labels_pie]
-        explode = [0.1] + [0]*(len(values_pie)-1) if values_pie else None
-        ax2.pie(values_pie, labels=labels_pie, autopct='%1.1f%%', startangle=140, explode=explode, colors=cols_pie)
-        ax2.set_title('Distribución de Ingresos')
-        
-        plt.tight_layout(pad=5.0) # Espacio para que no se peguen
-        pdf.savefig(fig_pg2)
-        plt.close()
-
-        # --- PÁGINA 3: PARETO Y TIMELINE ---
-        fig_pg3, (ax3, ax4) = plt.subplots(2, 1, figsize=(8.5, 11))
-        
-        # Pareto
-        ingr_prod = {}
-        for v in ventas: ingr_prod[v['producto']] = ingr_prod.get(v['producto'], 0) + v['ingresos']
-        sorted_par = sorted(ingr_prod.items(), key=lambda x: x[1], reverse=True)
-        pp = [x[0] for x in sorted_par]
-        ip = [x[1] for x in sorted_par]
-        cp = [product_colors.get(p, '#333') for p in pp]
-        tot = sum(ip)
-        acum = [sum(ip[:i+1])/tot*100 for i in range(len(ip))]
-
-        ax3.bar(pp, ip, color=cp)
-        ax3t = ax3.twinx()
-        ax3t.plot(pp, acum, color='red', marker='o')
-        ax3t.axhline(80, color='gray', linestyle='--')
-        ax3.set_title('Pareto')
-        ax3.tick_params(axis='x', rotation=45, labelsize=8)
-
-        # Timeline
-        f_map = {}
-        for v in ventas_por_fecha:
-            d = v['fecha'].date()
-            f_map[d] = f_map.get(d, 0) + v['ingresos']
-        ford = sorted(f_map.keys())
-        vtiem = [f_map[d] for d in ford]
-        
-        ax4.plot(ford, vtiem, marker='o', color='green')
-        ax4.set_title('Evolución Temporal')
-        ax4.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
-        ax4.tick_params(axis='x', rotation=45)
-
-        plt.tight_layout(pad=5.0)
-        pdf.savefig(fig_pg3)
-        plt.close()
-
-    # 5. ENVIAR ARCHIVO
-    buffer.seek(0)
-    return send_file(buffer, as_attachment=True, download_name=f"reporte_ventas_{datetime.now().date()}.pdf", mimetype='application/pdf')
+        return redirect(url_for('.dashboard'))
+
+    # 3. Páginas: portada + gráficos y, si se pide (?detalle=1), una evolución
+    # temporal por producto (de más a menos ingresos)
+    with etapa('aggregate'):
+        paleta = productos_existentes(collection)
+        specs = specs_informe(resumen, paleta, ventana.descripcion(), filtro_orden)
+        if request.args.get('detalle') == '1':
+            # Solo la ventana pedida y agregada por día, como el resto del informe
+            specs = chain(specs, specs_detalle(
+                resumen.pareto(top_n=None)['productos'], lambda nombre: serie_producto(collection, nombre, ventana.filtro())))
+
+    # 4. Se renderizan en paralelo en el pool y cada página se envía en cuanto
+    # está lista (respuesta por trozos, sin montar el PDF en memoria)
+    nombre_fichero = f"reporte_ventas_{datetime.now().date()}.pdf"
+    return Response(pdf_en_streaming(specs), mimetype='application/pdf',
+                    headers={'Content-Disposition': f'attachment; filename="{nombre_fichero}"'})
+
+# --- COMANDOS DE MANTENIMIENTO (flask --app app <comando>) ---
+@panel.cli.command('reconstruir-resumen')
+def reconstruir_resumen():
+    n = resumen_materializado.reconstruir(db)
+    incrementar_version(db)
+    print(f"--- RESUMEN RECONSTRUIDO ({n} contadores) ---")
+
+@panel.cli.command('importar-ventas')
+@click.argument('fichero', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'ndjson']), default=None)
+@click.option('--lote', type=click.IntRange(1, ingesta.LOTE_MAXIMO), default=ingesta.LOTE)
+def importar_ventas(fichero, formato, lote):
+    inicio = time.perf_counter()
+    with open(fichero, 'rb') as f:
+        informe = ingesta.importar(db, ingesta.leer_filas(f, formato or ingesta.formato_desde_tipo('', fichero)), lote)
+    segundos = time.perf_counter() - inicio
+    for l in informe['lotes']:
+        for err in l['detalle_errores']:
+            print(f"Lote {l['lote']}, fila {err['fila']}: {err['error']}")
+    print(f"--- {informe['total_insertadas']} ventas importadas, {informe['total_errores']} errores "
+          f"({informe['total_insertadas'] / max(segundos, 1e-9):,.0f} filas/s) ---")
+
+@panel.cli.command('verificar-resumen')
+def verificar_resumen():
+    diferencias = resumen_materializado.verificar(db)
+    for clave, esperado, actual in diferencias:
+        print(f"{clave}: esperado={esperado} actual={actual}")
+    if diferencias:
+        raise SystemExit(f"--- RESUMEN INCONSISTENTE ({len(diferencias)} diferencias) ---")
+    print("--- RESUMEN CONSISTENTE ---")
+
+# --- ARRANQUE ---
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = os.environ.get('SECRET_KEY', 'super_secret_key')
+    app.register_blueprint(panel)
+    metricas.instalar(app)
+    return app
+
+def iniciar_proceso():
+    # Una vez por proceso servidor, ya después del fork (gunicorn.conf.py)
+    base = conexion.obtener_db()
+    ensure_indexes(base)
+    cambios.crear_indices(base)
+    tareas.crear_indices(base)
+    # La restauración inicial la hace un solo proceso aunque arranquen varios
+    if tareas.adquirir_bloqueo(base, 'arranque'):
+        try:
+            if base['ventas'].count_documents({}) == 0:
+                cargar_datos_desde_backup()
+            elif base[resumen_materializado.COLECCION].count_documents({}) == 0:
+                resumen_materializado.reconstruir(base)
+            n = escrituras.rellenar_fechas(base)
+            if n:
+                print(f"--- {n} VENTAS SIN FECHA RELLENADAS ---")
+        finally:
+            tareas.liberar_bloqueo(base, 'arranque')
+    if FUENTE_ANALITICA == 'columnar':
+        # Se carga antes de atender peticiones y no en la primera
+        import columnar
+        instantanea = columnar.obtener(base)
+        print(f"--- INSTANTÁNEA COLUMNAR: {len(instantanea)} VENTAS, {instantanea.memoria() / 1e6:.1f} MB ---")
+    tareas.iniciar_worker(base, {'sincronizar': tarea_sincronizar})
+
+# Arranque en segundo plano (gunicorn.conf.py): una excepción en post_worker_init
+# tumba el servidor entero ("Worker failed to boot"), así que si Mongo no
+# responde el worker arranca igual, /readyz contesta 503 y se reintenta con
+# espera creciente hasta que Mongo vuelve.
+ARRANQUE_ESPERA_MAX = float(os.environ.get('ARRANQUE_ESPERA_MAX', 60))
+_arranque = {'pendiente': False, 'intentos': 0, 'error': None}
+
+def _reintentar_arranque():
+    espera = 1
+    while True:
+        _arranque['intentos'] += 1
+        try:
+            iniciar_proceso()
+        except PyMongoError as e:
+            _arranque['error'] = str(e)
+            print(f"--- ARRANQUE FALLIDO (intento {_arranque['intentos']}, reintento en {espera:.0f} s): {e} ---")
+            time.sleep(espera)
+            espera = min(espera * 2, ARRANQUE_ESPERA_MAX)
+            continue
+        except Exception as e:
+            # Un fallo que no es de Mongo no se arregla reintentando: el proceso
+            # sigue vivo pero no se da por listo
+            _arranque['error'] = str(e)
+            traceback.print_exc()
+            return
+        _arranque.update(pendiente=False, error=None)
+        return
+
+def iniciar_en_segundo_plano():
+    _arranque['pendiente'] = True
+    hilo = threading.Thread(target=_reintentar_arranque, name='arranque', daemon=True)
+    hilo.start()
+    return hilo
 
 if __name__ == '__main__':
-    if collection.count_documents({}) == 0:
-        cargar_datos_desde_json()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Servidor de desarrollo; en producción: gunicorn "app:create_app()"
+    iniciar_proceso()
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
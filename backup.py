@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+from itertools import islice
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+# --- BACKUP EN STREAMING ---
+# Formato: NDJSON comprimido con gzip (un documento Extended JSON por línea).
+# Se escribe directamente desde un cursor por lotes y se restaura leyendo el
+# fichero línea a línea, así que la memoria no depende del tamaño de los datos.
+# El formato antiguo (un array JSON con indent=4) se sigue pudiendo leer.
+
+LOTE = int(os.environ.get('BACKUP_LOTE', 1000))
+
+def exportar(collection, ruta, lote=LOTE):
+    # Se escribe en un temporal y se renombra: nunca queda un backup a medias
+    temporal = ruta + '.tmp'
+    n = 0
+    with gzip.open(temporal, 'wt', encoding='utf-8') as f:
+        for doc in collection.find().batch_size(lote):
+            f.write(json_util.dumps(doc))
+            f.write('\n')
+            n += 1
+    os.replace(temporal, ruta)
+    return n
+
+def _es_gzip(ruta):
+    with open(ruta, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+def _es_array_json(ruta):
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            if linea.strip():
+                return linea.lstrip().startswith('[')
+    return False
+
+def leer_documentos(ruta):
+    if _es_gzip(ruta):
+        abrir = lambda: gzip.open(ruta, 'rt', encoding='utf-8')
+    elif _es_array_json(ruta):
+        # Formato antiguo (datos_backup.json): es un único array, no se puede
+        # leer por partes, pero esos ficheros son pequeños
+        with open(ruta, 'r', encoding='utf-8') as f:
+            yield from json.load(f, object_hook=json_util.object_hook)
+        return
+    else:
+        abrir = lambda: open(ruta, 'r', encoding='utf-8')
+    with abrir() as f:
+        for linea in f:
+            if linea.strip():
+                yield json_util.loads(linea)
+
+def por_lotes(iterable, lote):
+    it = iter(iterable)
+    while True:
+        bloque = list(islice(it, lote))
+        if not bloque:
+            return
+        yield bloque
+
+def importar(collection, ruta, lote=LOTE):
+    n = 0
+    for bloque in por_lotes(leer_documentos(ruta), lote):
+        try:
+            n += len(collection.insert_many(bloque, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            # Documentos ya existentes (mismo _id): se cuentan los insertados y se sigue
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+            n += e.details.get('nInserted', 0)
+    return n
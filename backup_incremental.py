@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+from bson import json_util
+from pymongo import DeleteOne, ReplaceOne
+
+import backup
+import cambios
+
+# --- BACKUPS INCREMENTALES ---
+# En vez de reescribir todo el snapshot en cada sincronización:
+#
+#   backups/base.ndjson.gz              snapshot completo (formato de backup.py)
+#   backups/segmentos/<desde>-<hasta>.ndjson.gz
+#                                       cambios con seq en (desde, hasta]
+#   backups/estado.json                 {"base_seq": ..., "seq": ...}
+#
+# Cada sincronización solo añade un segmento con los cambios nuevos, así que su
+# coste (y lo que crece el historial de git) depende del tamaño del cambio.
+# Cada COMPACTAR_CADA segmentos se rehace la base y se borran los segmentos.
+# Restaurar = cargar la base y reaplicar los segmentos posteriores en orden.
+
+DIRECTORIO = os.environ.get('BACKUP_DIR', 'backups')
+COMPACTAR_CADA = int(os.environ.get('BACKUP_COMPACTAR_CADA', 50))
+HUECO_SEGUNDOS = 60
+
+_SEGMENTO = re.compile(r'^(\d{12})-(\d{12})\.ndjson\.gz$')
+
+def _rutas(directorio):
+    return (os.path.join(directorio, 'base.ndjson.gz'),
+            os.path.join(directorio, 'segmentos'),
+            os.path.join(directorio, 'estado.json'))
+
+def leer_estado(directorio=DIRECTORIO):
+    _, _, ruta_estado = _rutas(directorio)
+    if not os.path.exists(ruta_estado):
+        return None
+    with open(ruta_estado, 'r') as f:
+        return json.load(f)
+
+def _guardar_estado(directorio, estado):
+    _, _, ruta_estado = _rutas(directorio)
+    temporal = ruta_estado + '.tmp'
+    with open(temporal, 'w') as f:
+        json.dump(estado, f, indent=4)
+    os.replace(temporal, ruta_estado)
+
+def segmentos(directorio=DIRECTORIO):
+    # [(desde, hasta, ruta)] ordenados
+    _, dir_segmentos, _ = _rutas(directorio)
+    if not os.path.isdir(dir_segmentos):
+        return []
+    encontrados = []
+    for nombre in os.listdir(dir_segmentos):
+        m = _SEGMENTO.match(nombre)
+        if m:
+            encontrados.append((int(m.group(1)), int(m.group(2)), os.path.join(dir_segmentos, nombre)))
+    return sorted(encontrados)
+
+def compactar(db, directorio=DIRECTORIO):
+    ruta_base, _, _ = _rutas(directorio)
+    os.makedirs(directorio, exist_ok=True)
+    # Los cambios posteriores a este seq se reaplican encima del snapshot; las
+    # operaciones son idempotentes, así que no importa si el snapshot ya los ve
+    base_seq = cambios.seq_actual(db)
+    n = backup.exportar(db['ventas'], ruta_base)
+    for _, _, ruta in segmentos(directorio):
+        os.remove(ruta)
+    _guardar_estado(directorio, {'base_seq': base_seq, 'seq': base_seq})
+    cambios.podar(db, base_seq)
+    return n
+
+def sincronizar(db, directorio=DIRECTORIO):
+    ruta_base, dir_segmentos, _ = _rutas(directorio)
+    estado = leer_estado(directorio)
+    if estado is None or not os.path.exists(ruta_base):
+        n = compactar(db, directorio)
+        return f"Snapshot base creado ({n} documentos)."
+
+    desde_seq = estado['seq']
+    hasta_seq = cambios.seq_actual(db)
+    if hasta_seq <= desde_seq:
+        return "Sin cambios desde la última sincronización."
+
+    os.makedirs(dir_segmentos, exist_ok=True)
+    temporal = os.path.join(dir_segmentos, 'segmento.tmp')
+    ultimo = desde_seq
+    limite_hueco = datetime.utcnow() - timedelta(seconds=HUECO_SEGUNDOS)
+    with gzip.open(temporal, 'wt', encoding='utf-8') as f:
+        for registro in cambios.desde(db, desde_seq, hasta_seq).batch_size(backup.LOTE):
+            # Un seq reservado cuyo registro aún no se ha escrito deja un hueco:
+            # se corta ahí y esos cambios entran en la siguiente sincronización.
+            # Si el hueco ya es antiguo, el proceso que lo reservó murió: se salta.
+            if registro['seq'] != ultimo + 1 and registro['ts'] > limite_hueco:
+                break
+            f.write(json_util.dumps(registro))
+            f.write('\n')
+            ultimo = registro['seq']
+    n = ultimo - desde_seq
+    if not n:
+        os.remove(temporal)
+        return "Sin cambios completos que guardar todavía."
+    hasta_seq = ultimo
+    os.replace(temporal, os.path.join(dir_segmentos, f"{desde_seq:012d}-{hasta_seq:012d}.ndjson.gz"))
+    _guardar_estado(directorio, {'base_seq': estado['base_seq'], 'seq': hasta_seq})
+
+    if len(segmentos(directorio)) >= COMPACTAR_CADA:
+        compactar(db, directorio)
+        return f"Segmento con {n} cambios; backup compactado."
+    return f"Segmento con {n} cambios."
+
+# --- RESTAURACIÓN ---
+
+def _operacion(registro):
+    if registro['op'] == 'baja':
+        return DeleteOne({'_id': registro['id']})
+    return ReplaceOne({'_id': registro['id']}, registro['doc'], upsert=True)
+
+def restaurar(db, directorio=DIRECTORIO):
+    ruta_base, _, _ = _rutas(directorio)
+    estado = leer_estado(directorio)
+    if estado is None or not os.path.exists(ruta_base):
+        return None
+    collection = db['ventas']
+    n = backup.importar(collection, ruta_base)
+    aplicados = 0
+    for desde_seq, hasta_seq, ruta in segmentos(directorio):
+        if hasta_seq <= estado['base_seq']:
+            continue
+        # Dentro de un lote el orden importa (alta y luego baja del mismo id)
+        for bloque in backup.por_lotes(backup.leer_documentos(ruta), backup.LOTE):
+            bloque = [r for r in bloque if r['seq'] > estado['base_seq']]
+            if bloque:
+                collection.bulk_write([_operacion(r) for r in bloque], ordered=True)
+                aplicados += len(bloque)
+    # La numeración de cambios continúa donde la dejó el backup
+    cambios.avanzar_seq(db, max(estado['seq'], max((h for _, h, _ in segmentos(directorio)), default=0)))
+    return n, aplicados
@@ -0,0 +1,93 @@
+# Tiempo de arranque en frío: cada medida se hace en un proceso Python nuevo.
+#
+#   import app            importar la aplicación (no debe cargar matplotlib)
+#   primera respuesta     create_app() + primera petición (/metrics, sin Mongo)
+#   primer gráfico        primer renderizado con la caché de fuentes ya creada
+#   primer gráfico (frío) lo mismo con un MPLCONFIGDIR vacío, como un contenedor
+#                         sin la caché generada al construir la imagen
+#
+# Uso: python benchmarks/bench_arranque.py [repeticiones] [--salida arranque.json]
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MEDIDAS = {
+    'import app': '''
+import app
+extra = {'matplotlib_cargado': 'matplotlib' in sys.modules}
+''',
+    'primera respuesta': '''
+import app
+cliente = app.create_app().test_client()
+assert cliente.get('/metrics').status_code == 200
+extra = {'matplotlib_cargado': 'matplotlib' in sys.modules}
+''',
+    'primer gráfico': '''
+import graficos
+graficos.renderizar({'tipo': 'tarta', 'labels': ['A', 'B'], 'values': [1, 2], 'paleta': ['A', 'B']})
+extra = {}
+''',
+}
+
+PLANTILLA = '''
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {raiz!r})
+{codigo}
+print(json.dumps(dict(extra, segundos=time.perf_counter() - t0)))
+'''
+
+
+def ejecutar(codigo, entorno):
+    t0 = time.perf_counter()
+    salida = subprocess.run([sys.executable, '-c', PLANTILLA.format(raiz=RAIZ, codigo=codigo)],
+                            env=entorno, cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+    resultado = json.loads(salida.strip().splitlines()[-1])
+    # Incluye el arranque del intérprete
+    resultado['segundos_proceso'] = time.perf_counter() - t0
+    return resultado
+
+
+def medir(codigo, repeticiones, entorno, mplconfig_nuevo=False):
+    resultados = []
+    for _ in range(repeticiones):
+        with tempfile.TemporaryDirectory() as vacio:
+            if mplconfig_nuevo:
+                entorno = dict(entorno, MPLCONFIGDIR=vacio)
+            resultados.append(ejecutar(codigo, entorno))
+    resumen = {
+        'mediana_s': round(statistics.median(r['segundos'] for r in resultados), 4),
+        'mediana_proceso_s': round(statistics.median(r['segundos_proceso'] for r in resultados), 4),
+    }
+    resumen.update({k: v for k, v in resultados[-1].items() if k not in ('segundos', 'segundos_proceso')})
+    return resumen
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    salida = None
+    if '--salida' in argumentos:
+        i = argumentos.index('--salida')
+        salida = argumentos[i + 1]
+        del argumentos[i:i + 2]
+    repeticiones = int(argumentos[0]) if argumentos else 5
+
+    # Se dibuja en el propio proceso: se mide el arranque, no el del pool
+    entorno = dict(os.environ, GRAFICOS_PROCESOS='0')
+    resultados = {nombre: medir(codigo, repeticiones, entorno) for nombre, codigo in MEDIDAS.items()}
+    resultados['primer gráfico (frío)'] = medir(MEDIDAS['primer gráfico'], repeticiones, entorno,
+                                                 mplconfig_nuevo=True)
+
+    print(f"{'medida':<24} {'código (s)':>11} {'proceso (s)':>12}")
+    for nombre, r in resultados.items():
+        nota = '  (carga matplotlib)' if r.get('matplotlib_cargado') else ''
+        print(f"{nombre:<24} {r['mediana_s']:>11.3f} {r['mediana_proceso_s']:>12.3f}{nota}")
+    if salida:
+        with open(salida, 'w') as f:
+            json.dump(resultados, f, indent=4, ensure_ascii=False)
@@ -0,0 +1,78 @@
+# Instantánea columnar (columnar.py) frente a filas como dicts de pymongo:
+# memoria por venta y tiempo de agregación (todo el histórico y una ventana de
+# 30 días). No necesita Mongo: las filas se generan en memoria.
+#
+# Uso: python benchmarks/bench_columnar.py [100000 1000000] [--salida columnar.json]
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agregados import ResumenVentas
+from columnar import InstantaneaVentas
+from bench_resumen import generar_ventas
+
+INICIO_VENTANA = datetime(2024, 12, 2)
+FIN_VENTANA = datetime(2025, 1, 1)
+
+
+def cronometrar(funcion, repeticiones=20):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return round(statistics.median(tiempos) * 1000, 3)
+
+
+def medir(n):
+    tracemalloc.start()
+    filas = generar_ventas(n, sesgo=1.0)
+    for fila in filas:
+        fila['_id'] = ObjectId()
+    bytes_filas = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    instantanea = InstantaneaVentas()
+    t0 = time.perf_counter()
+    instantanea.cargar_filas(filas)
+    carga_s = time.perf_counter() - t0
+
+    en_ventana = [f for f in filas if INICIO_VENTANA <= f['fecha'] < FIN_VENTANA]
+    return {
+        'filas': n,
+        'bytes_por_fila_dicts': round(bytes_filas / n, 1),
+        'bytes_por_fila_columnar': round(instantanea.memoria() / n, 1),
+        'carga_s': round(carga_s, 3),
+        'todo_dicts_ms': cronometrar(lambda: ResumenVentas.desde_filas(filas), 3),
+        'todo_columnar_ms': cronometrar(lambda: instantanea.resumen()),
+        'ventana_dicts_ms': cronometrar(lambda: ResumenVentas.desde_filas(en_ventana), 3),
+        'ventana_columnar_ms': cronometrar(lambda: instantanea.resumen(INICIO_VENTANA, FIN_VENTANA)),
+    }
+
+
+if __name__ == '__main__':
+    argumentos = sys.argv[1:]
+    salida = None
+    if '--salida' in argumentos:
+        i = argumentos.index('--salida')
+        salida = argumentos[i + 1]
+        del argumentos[i:i + 2]
+    tamanos = [int(a) for a in argumentos] or [100_000, 1_000_000]
+
+    resultados = [medir(n) for n in tamanos]
+    print(f"{'filas':>9} {'B/fila dict':>12} {'B/fila col':>11} {'todo dict ms':>13} "
+          f"{'todo col ms':>12} {'30d dict ms':>12} {'30d col ms':>11}")
+    for r in resultados:
+        print(f"{r['filas']:>9} {r['bytes_por_fila_dicts']:>12} {r['bytes_por_fila_columnar']:>11} "
+              f"{r['todo_dicts_ms']:>13} {r['todo_columnar_ms']:>12} "
+              f"{r['ventana_dicts_ms']:>12} {r['ventana_columnar_ms']:>11}")
+    if salida:
+        with open(salida, 'w') as f:
+            json.dump(resultados, f, indent=4)
@@ -0,0 +1,56 @@
+# Throughput de la ingesta masiva (filas/s) contra un mongod local, comparado
+# con insertar venta a venta como hace /agregar.
+#
+# Uso: MONGO_URI=mongodb://localhost:27017/ python benchmarks/bench_ingesta.py [filas]
+# Usa una base de datos propia ('bench_ingesta') que se borra al terminar.
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from pymongo import MongoClient
+
+import escrituras
+import ingesta
+from bench_resumen import generar_ventas
+
+
+def ndjson(ventas):
+    return io.BytesIO(''.join(
+        json.dumps(dict(v, fecha=v['fecha'].strftime('%Y-%m-%d'))) + '\n' for v in ventas
+    ).encode())
+
+
+def limpiar(db):
+    for nombre in ('ventas', 'ventas_resumen', 'cambios', 'meta'):
+        db[nombre].drop()
+
+
+if __name__ == '__main__':
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    db = client['bench_ingesta']
+    ventas = generar_ventas(filas)
+
+    try:
+        # Referencia: una ida y vuelta por venta (como el formulario de /agregar)
+        limpiar(db)
+        muestra = ventas[:max(filas // 100, 100)]
+        t0 = time.perf_counter()
+        for v in muestra:
+            escrituras.alta(db, escrituras.validar_venta(dict(v)))
+        t = time.perf_counter() - t0
+        print(f"{'una a una':>12}: {len(muestra) / t:>10,.0f} filas/s ({len(muestra)} filas)")
+
+        for lote in (100, 1000, 5000):
+            limpiar(db)
+            datos = ndjson(ventas)
+            t0 = time.perf_counter()
+            informe = ingesta.importar(db, ingesta.leer_filas(datos, 'ndjson'), lote)
+            t = time.perf_counter() - t0
+            print(f"{'lote ' + str(lote):>12}: {informe['total_insertadas'] / t:>10,.0f} filas/s "
+                  f"({informe['total_insertadas']} filas, {informe['total_errores']} errores)")
+    finally:
+        client.drop_database('bench_ingesta')
@@ -0,0 +1,83 @@
+# Micro-benchmark: cálculo antiguo (varias pasadas + sort completo) frente a
+# ResumenVentas.desde_filas (una sola pasada).
+#
+# Uso: python benchmarks/bench_resumen.py [10000 100000 1000000]
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from agregados import ResumenVentas
+
+
+def generar_ventas(n, productos=50, dias=365, semilla=1, sesgo=0.0, inicio=datetime(2024, 1, 1)):
+    # sesgo > 0: popularidad tipo Zipf (el producto i pesa 1 / (i+1)**sesgo)
+    rnd = random.Random(semilla)
+    nombres = [f"Producto {i}" for i in range(productos)]
+    if sesgo:
+        pesos = [1 / (i + 1) ** sesgo for i in range(productos)]
+        elegir = lambda: rnd.choices(nombres, pesos)[0]
+    else:
+        elegir = lambda: rnd.choice(nombres)
+    return [{
+        'producto': elegir(),
+        'cantidad': rnd.randint(1, 10),
+        'ingresos': round(rnd.uniform(5, 500), 2),
+        'fecha': inicio + timedelta(days=rnd.randrange(dias), seconds=rnd.randrange(86400)),
+    } for _ in range(n)]
+
+
+def calculo_antiguo(ventas):
+    # Reproduce lo que hacía dashboard(): obtener_kpis, preparar_datos_tarta,
+    # barras, Pareto y timeline recorrían la lista cada uno por su cuenta.
+    total = sum(d['ingresos'] for d in ventas)
+    prod_ingresos = {}
+    for v in ventas:
+        prod_ingresos[v['producto']] = prod_ingresos.get(v['producto'], 0) + v['ingresos']
+    max(prod_ingresos, key=prod_ingresos.get)
+    agrupado = {}
+    for v in ventas:
+        agrupado[v['producto']] = agrupado.get(v['producto'], 0) + v['ingresos']
+    sorted(agrupado.items(), key=lambda x: x[1], reverse=True)
+    ventas_por_fecha = sorted(ventas, key=lambda x: x['fecha'])
+    prod_cantidad, prod_ingr = {}, {}
+    for v in ventas:
+        prod_cantidad[v['producto']] = prod_cantidad.get(v['producto'], 0) + v['cantidad']
+        prod_ingr[v['producto']] = prod_ingr.get(v['producto'], 0) + v['ingresos']
+    sorted(prod_cantidad.items(), key=lambda item: item[1], reverse=True)
+    ingresos_por_prod = {}
+    for v in ventas:
+        ingresos_por_prod[v['producto']] = ingresos_por_prod.get(v['producto'], 0) + v['ingresos']
+    ip = [x[1] for x in sorted(ingresos_por_prod.items(), key=lambda x: x[1], reverse=True)]
+    [sum(ip[:i+1])/total*100 for i in range(len(ip))]
+    fechas_map = {}
+    for v in ventas_por_fecha:
+        dia = v['fecha'].date()
+        fechas_map[dia] = fechas_map.get(dia, 0) + v['ingresos']
+    sorted(fechas_map.keys())
+
+
+def calculo_nuevo(ventas):
+    r = ResumenVentas.desde_filas(ventas)
+    r.kpis(); r.tarta(); r.barras(); r.pareto(); r.timeline()
+
+
+def medir(fn, ventas, repeticiones=3):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn(ventas)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+if __name__ == '__main__':
+    tamanos = [int(x) for x in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'filas':>10} {'antiguo (s)':>12} {'nuevo (s)':>10} {'speedup':>8}")
+    for n in tamanos:
+        ventas = generar_ventas(n)
+        t_ant = medir(calculo_antiguo, ventas)
+        t_nue = medir(calculo_nuevo, ventas)
+        print(f"{n:>10} {t_ant:>12.4f} {t_nue:>10.4f} {t_ant / t_nue:>7.1f}x")
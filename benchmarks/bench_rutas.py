@@ -0,0 +1,179 @@
+# Benchmark de extremo a extremo: carga ventas sintéticas y recorre las rutas
+# principales con el cliente de pruebas de Flask (dashboard con sus filtros,
+# gráficos, API JSON, producto_detalle, gestion, reporte_pdf y agregar).
+#
+# Para cada tamaño de datos informa de latencia p50/p95, peticiones/s y pico
+# de RSS, y guarda todo en JSON para poder comparar ejecuciones.
+#
+# Uso: MONGO_URI=mongodb://localhost:27017/ python benchmarks/bench_rutas.py \
+#          [--filas 1000 10000 100000] [--productos 50] [--dias 365] [--sesgo 1.1] \
+#          [--repeticiones 20] [--salida resultados.json] [--mongomock]
+#
+# Usa una base de datos propia ('bench_rutas') que se borra al terminar.
+# Los gráficos se dibujan en este mismo proceso (GRAFICOS_PROCESOS=0, como en
+# bench_arranque.py): el pico de RSS solo mide este proceso y con el pool se
+# quedaría fuera la memoria de los workers que dibujan.
+# Con --mongomock no hace falta mongod, pero mongomock no implementa todas las
+# etapas de agregación ($facet, $$NOW...) y sus tiempos no son representativos.
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+# Antes de importar graficos, que lee la variable al cargarse
+os.environ['GRAFICOS_PROCESOS'] = '0'
+import app as aplicacion
+import consultas
+import graficos
+import resumen_materializado
+from cache_graficos import incrementar_version
+from bench_resumen import generar_ventas
+
+BASE_DATOS = 'bench_rutas'
+
+
+def preparar(db, ventas):
+    for nombre in db.list_collection_names():
+        db[nombre].drop()
+    consultas.ensure_indexes(db)
+    for i in range(0, len(ventas), 10_000):
+        db['ventas'].insert_many([dict(v) for v in ventas[i:i + 10_000]], ordered=False)
+    resumen_materializado.reconstruir(db)
+    incrementar_version(db)
+    aplicacion.cache_graficos.limpiar()
+
+
+def escenarios(productos, rnd):
+    # (nombre, método, función que devuelve (url, datos del formulario))
+    def dashboard(tiempo, orden):
+        return lambda: (f'/?tiempo={tiempo}&orden={orden}', None)
+
+    def sin_cache(url):
+        # Se mide el cálculo (y el dibujo), no un acierto de la caché
+        def peticion():
+            aplicacion.cache_graficos.limpiar()
+            return url, None
+        return peticion
+
+    def producto():
+        return f'/producto/{quote(rnd.choice(productos))}', None
+
+    def agregar():
+        return '/agregar', {'producto': rnd.choice(productos), 'cantidad': str(rnd.randint(1, 10)),
+                            'ingresos': f'{rnd.uniform(5, 500):.2f}', 'fecha': '2024-06-01'}
+
+    lista = [(f'dashboard {t}/{o}', 'GET', dashboard(t, o))
+             for t in ('todo', '30dias') for o in ('cantidad', 'ingresos')]
+    lista += [(f'chart {g} {t}', 'GET', sin_cache(f'/chart/{g}.png?tiempo={t}'))
+              for g in ('barras', 'tarta', 'pareto', 'timeline') for t in ('todo', '30dias')]
+    lista += [(f'api_dashboard {t}', 'GET', sin_cache(f'/api/dashboard?tiempo={t}')) for t in ('todo', '30dias')]
+    lista += [('api_producto', 'GET', lambda: (f'/api/producto/{quote(rnd.choice(productos))}', None))]
+    lista += [('producto_detalle', 'GET', producto),
+              ('gestion', 'GET', lambda: ('/gestion', None)),
+              ('reporte_pdf', 'GET', lambda: ('/reporte_pdf', None)),
+              ('agregar', 'POST', agregar)]
+    return lista
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def rss_pico_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def medir(cliente, metodo, peticion, repeticiones):
+    tiempos = []
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        url, datos = peticion()
+        t0 = time.perf_counter()
+        r = cliente.open(url, method=metodo, data=datos)
+        r.get_data()  # consume las respuestas en streaming (PDF)
+        tiempos.append(time.perf_counter() - t0)
+        if r.status_code >= 400:
+            raise RuntimeError(f'{metodo} {url} -> {r.status_code}')
+    total = time.perf_counter() - inicio
+    return {
+        'repeticiones': repeticiones,
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 2),
+        'p95_ms': round(percentil(tiempos, 95) * 1000, 2),
+        'peticiones_s': round(repeticiones / total, 2),
+        'rss_pico_mb': rss_pico_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--productos', type=int, default=50)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--sesgo', type=float, default=1.1)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--salida', default=f"bench_rutas_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument('--mongomock', action='store_true')
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+
+    # Las rutas usan los globales del módulo: se apuntan a la base de pruebas
+    db = client[BASE_DATOS]
+    aplicacion.db, aplicacion.collection = db, db['ventas']
+    app = aplicacion.create_app()
+    app.config['TESTING'] = True
+    cliente = app.test_client()
+    # Los datos acaban "hoy" para que el filtro de 30 días tenga contenido
+    inicio = datetime.now() - timedelta(days=args.dias)
+
+    resultados = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'graficos_procesos': graficos.PROCESOS,
+        'parametros': {k: v for k, v in vars(args).items() if k != 'salida'},
+        'tamanos': [],
+    }
+    try:
+        for filas in args.filas:
+            ventas = generar_ventas(filas, args.productos, args.dias, sesgo=args.sesgo, inicio=inicio)
+            t0 = time.perf_counter()
+            preparar(db, ventas)
+            carga = time.perf_counter() - t0
+            productos = sorted({v['producto'] for v in ventas})
+            rnd = random.Random(filas)
+
+            print(f"--- {filas} filas (carga {carga:.1f} s) ---")
+            print(f"{'escenario':<26} {'p50 (ms)':>10} {'p95 (ms)':>10} {'pet/s':>8} {'RSS (MB)':>9}")
+            por_ruta = {}
+            for nombre, metodo, peticion in escenarios(productos, rnd):
+                medir(cliente, metodo, peticion, 1)  # calentamiento (pool, plantillas)
+                r = por_ruta[nombre] = medir(cliente, metodo, peticion, args.repeticiones)
+                print(f"{nombre:<26} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+                      f"{r['peticiones_s']:>8.1f} {r['rss_pico_mb']:>9.1f}")
+            resultados['tamanos'].append({'filas': filas, 'carga_s': round(carga, 2), 'rutas': por_ruta})
+    finally:
+        client.drop_database(BASE_DATOS)
+
+    with open(args.salida, 'w') as f:
+        json.dump(resultados, f, indent=4, ensure_ascii=False)
+    print(f"Resultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
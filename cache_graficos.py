@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# --- CACHÉ DE GRÁFICOS RENDERIZADOS ---
+# Renderizar con matplotlib es lo más caro de cada petición. Guardamos el
+# resultado ya codificado, con política LRU + caducidad (TTL). La clave incluye
+# la versión de los datos, así que cualquier escritura invalida lo anterior.
+
+class CacheGraficos:
+
+    def __init__(self, max_entradas=256, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()   # clave -> (caduca_en, valor)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._datos[clave]
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def obtener_o_calcular(self, clave, calcular):
+        valor = self.obtener(clave)
+        if valor is None:
+            # Se renderiza fuera del lock: dos peticiones simultáneas pueden
+            # calcular lo mismo, pero ninguna bloquea a las demás
+            valor = calcular()
+            self.guardar(clave, valor)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'ratio_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+            }
+
+
+# --- VERSIÓN DE LOS DATOS ---
+# Contador guardado en Mongo (y no en memoria) para que todos los procesos
+# vean la misma versión. Lo incrementan las rutas que escriben en 'ventas'.
+
+def estado_datos(db):
+    # (versión, fecha de la última escritura) -> sirve para claves y ETag/Last-Modified
+    doc = db['meta'].find_one({'_id': 'ventas'})
+    if not doc:
+        return 0, None
+    return doc['version'], doc.get('actualizado')
+
+def incrementar_version(db):
+    db['meta'].update_one({'_id': 'ventas'},
+                          {'$inc': {'version': 1}, '$set': {'actualizado': datetime.utcnow()}},
+                          upsert=True)
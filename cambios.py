@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, ReturnDocument
+
+# --- REGISTRO DE CAMBIOS ---
+# Log tipo oplog de todas las escrituras sobre 'ventas': cada entrada lleva un
+# número de secuencia creciente. Lo usan los backups incrementales para saber
+# qué ha cambiado desde el último checkpoint.
+#
+#   {seq, op: 'alta' | 'cambio' | 'baja', id, doc (alta/cambio), ts}
+
+COLECCION = 'cambios'
+
+def crear_indices(db):
+    db[COLECCION].create_index([('seq', ASCENDING)], unique=True)
+
+def _siguiente_seq(db, n=1):
+    # Reserva n números consecutivos y devuelve el primero
+    contador = db['meta'].find_one_and_update({'_id': 'cambios'}, {'$inc': {'seq': n}},
+                                              upsert=True, return_document=ReturnDocument.AFTER)
+    return contador['seq'] - n + 1
+
+def estado(db):
+    # (último seq reservado, último seq podado)
+    contador = db['meta'].find_one({'_id': 'cambios'}) or {}
+    return contador.get('seq', 0), contador.get('podado', 0)
+
+def seq_actual(db):
+    return estado(db)[0]
+
+def avanzar_seq(db, seq):
+    db['meta'].update_one({'_id': 'cambios'}, {'$max': {'seq': seq}}, upsert=True)
+
+def registrar(db, op, venta_id, doc=None):
+    registrar_varios(db, [(op, venta_id, doc)])
+
+def registrar_varios(db, operaciones):
+    if not operaciones:
+        return
+    primero = _siguiente_seq(db, len(operaciones))
+    ahora = datetime.utcnow()
+    db[COLECCION].insert_many([
+        {'seq': primero + i, 'op': op, 'id': venta_id, 'doc': doc, 'ts': ahora}
+        for i, (op, venta_id, doc) in enumerate(operaciones)
+    ], ordered=True)
+
+def desde(db, seq, hasta=None):
+    filtro = {'seq': {'$gt': seq}}
+    if hasta is not None:
+        filtro['seq']['$lte'] = hasta
+    return db[COLECCION].find(filtro, {'_id': 0}).sort('seq', ASCENDING)
+
+def podar(db, hasta_seq):
+    # La marca va antes del borrado: quien lea el log desde un seq anterior
+    # (columnar.py) sabe que ya no está completo y tiene que recargar
+    db['meta'].update_one({'_id': 'cambios'}, {'$max': {'podado': hasta_seq}}, upsert=True)
+    db[COLECCION].delete_many({'seq': {'$lte': hasta_seq}})
@@ -0,0 +1,81 @@
+import os
+
+import pymongo
+from pymongo import MongoClient
+
+import metricas
+
+# --- CONEXIÓN A MONGO ---
+# El cliente se crea la primera vez que se usa en cada proceso, nunca al
+# importar: con un servidor que hace fork (gunicorn con preload) cada worker
+# abre su propio pool de conexiones en vez de heredar sockets del maestro.
+#
+# Ajustes por variables de entorno (las que no se definan quedan con el valor
+# de la URI o el de pymongo):
+#
+#   MONGO_POOL_MAX / MONGO_POOL_MIN      conexiones por proceso
+#   MONGO_ESPERA_POOL_MS                 espera máxima por una conexión libre
+#   MONGO_TIMEOUT_SELECCION_MS           buscar servidor (5 s; pymongo usa 30 s)
+#   MONGO_TIMEOUT_CONEXION_MS            abrir conexión (5 s)
+#   MONGO_TIMEOUT_SOCKET_MS              esperar una respuesta
+#   MONGO_W, MONGO_READ_CONCERN          p. ej. 'majority'
+#   MONGO_READ_PREFERENCE                p. ej. 'secondaryPreferred' (ojo: lecturas
+#                                        justo después de escribir pueden no verse)
+#   MONGO_COMPRESORES                    p. ej. 'zstd,snappy,zlib' (zstd y snappy
+#                                        necesitan los paquetes zstandard / python-snappy)
+
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+BASE_DATOS = os.environ.get('MONGO_DB', 'mi_negocio')
+# Presupuesto total de la comprobación de /readyz
+TIMEOUT_PING = float(os.environ.get('MONGO_TIMEOUT_PING', 2))
+
+_OPCIONES = {
+    # variable de entorno: (opción de MongoClient, conversión, valor por defecto)
+    'MONGO_POOL_MAX': ('maxPoolSize', int, None),
+    'MONGO_POOL_MIN': ('minPoolSize', int, None),
+    'MONGO_ESPERA_POOL_MS': ('waitQueueTimeoutMS', int, None),
+    'MONGO_TIMEOUT_SELECCION_MS': ('serverSelectionTimeoutMS', int, 5000),
+    'MONGO_TIMEOUT_CONEXION_MS': ('connectTimeoutMS', int, 5000),
+    'MONGO_TIMEOUT_SOCKET_MS': ('socketTimeoutMS', int, None),
+    'MONGO_W': ('w', lambda v: int(v) if v.isdigit() else v, None),
+    'MONGO_READ_CONCERN': ('readConcernLevel', str, None),
+    'MONGO_READ_PREFERENCE': ('readPreference', str, None),
+    'MONGO_COMPRESORES': ('compressors', str, None),
+}
+
+_cliente = None
+_pid = None
+_oyente = None
+
+def opciones_cliente(entorno=os.environ):
+    opciones = {}
+    for variable, (opcion, convertir, defecto) in _OPCIONES.items():
+        valor = entorno.get(variable)
+        if valor:
+            opciones[opcion] = convertir(valor)
+        elif defecto is not None:
+            opciones[opcion] = defecto
+    return opciones
+
+def cliente():
+    global _cliente, _pid, _oyente
+    if _cliente is None or _pid != os.getpid():
+        _oyente = metricas.OyentePool()
+        _cliente = MongoClient(MONGO_URI, event_listeners=[_oyente], **opciones_cliente())
+        _pid = os.getpid()
+    return _cliente
+
+def estado_pool():
+    # (conexiones abiertas, en uso) de este proceso; None si aún no hay cliente
+    if _oyente is None or _pid != os.getpid():
+        return None
+    return _oyente.abiertas, _oyente.en_uso
+
+def obtener_db():
+    return cliente()[BASE_DATOS]
+
+def ping(timeout=TIMEOUT_PING):
+    # El límite cubre también la selección de servidor: con Mongo caído
+    # responde en 'timeout' segundos y no en serverSelectionTimeoutMS
+    with pymongo.timeout(timeout):
+        cliente().admin.command('ping')
@@ -0,0 +1,67 @@
+import os
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+import resumen_materializado
+
+# --- ÍNDICES ---
+# Los listados ordenan por fecha descendente (y por _id para desempatar), así
+# que los índices incluyen ambos campos: Mongo recorre el índice en orden y no
+# necesita ordenar en memoria (límite de 100MB).
+
+PAGINA_TAMANO = int(os.environ.get('PAGINA_TAMANO', 50))
+PAGINA_MAXIMO = 500
+
+ORDEN_LISTADO = [('fecha', DESCENDING), ('_id', DESCENDING)]
+CAMPOS_LISTADO = {'fecha': 1, 'producto': 1, 'cantidad': 1, 'ingresos': 1}
+CAMPOS_DETALLE = {'fecha': 1, 'cantidad': 1, 'ingresos': 1}
+
+def ensure_indexes(db):
+    ventas = db['ventas']
+    ventas.create_index(ORDEN_LISTADO, name='fecha_-1__id_-1')
+    ventas.create_index([('producto', ASCENDING)] + ORDEN_LISTADO, name='producto_1_fecha_-1__id_-1')
+    resumen_materializado.crear_indices(db)
+
+# --- PAGINACIÓN POR CURSOR (keyset) ---
+# En vez de skip(), cada página empieza justo después de la última fila de la
+# anterior: el coste no crece con el número de página. El cursor es
+# "<fecha iso>_<_id>" (fecha vacía para ventas sin fecha, que van al final).
+
+def tamano_pagina(valor):
+    try:
+        return max(1, min(int(valor), PAGINA_MAXIMO))
+    except (TypeError, ValueError):
+        return PAGINA_TAMANO
+
+def codificar_cursor(venta):
+    fecha = venta.get('fecha')
+    return f"{fecha.isoformat() if fecha else ''}_{venta['_id']}"
+
+def decodificar_cursor(cursor):
+    try:
+        fecha_str, id_str = cursor.rsplit('_', 1)
+        fecha = datetime.fromisoformat(fecha_str) if fecha_str else None
+        return fecha, ObjectId(id_str)
+    except (ValueError, InvalidId):
+        return None
+
+def _filtro_despues_de(fecha, oid):
+    if fecha is None:
+        return {'fecha': None, '_id': {'$lt': oid}}
+    return {'$or': [{'fecha': {'$lt': fecha}},
+                    {'fecha': fecha, '_id': {'$lt': oid}},
+                    {'fecha': None}]}
+
+def pagina_ventas(collection, filtro=None, proyeccion=None, cursor=None, tamano=PAGINA_TAMANO):
+    consulta = dict(filtro or {})
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion:
+        consulta = {'$and': [consulta, _filtro_despues_de(*posicion)]} if consulta else _filtro_despues_de(*posicion)
+
+    # Pedimos una fila de más para saber si hay página siguiente
+    filas = list(collection.find(consulta, proyeccion).sort(ORDEN_LISTADO).limit(tamano + 1))
+    siguiente = codificar_cursor(filas[tamano - 1]) if len(filas) > tamano else None
+    return filas[:tamano], siguiente
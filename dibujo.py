@@ -0,0 +1,170 @@
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.dates as mdates
+import matplotlib.style
+from matplotlib.figure import Figure
+
+# --- DIBUJO CON MATPLOTLIB ---
+# Todo lo que necesita matplotlib vive aquí y solo se importa al dibujar
+# (graficos.py lo carga bajo demanda), así que las rutas que no pintan nada
+# no pagan su importación. Cada spec se dibuja con la API orientada a objetos
+# (Figure/Axes), sin el estado global de pyplot.
+
+_preparado = False
+
+def preparar_matplotlib():
+    # Estilo y caché de fuentes una sola vez por proceso
+    global _preparado
+    if _preparado:
+        return
+    matplotlib.style.use('ggplot')
+    fig = Figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, 'Á€')
+    fig.savefig(io.BytesIO(), format='png')
+    _preparado = True
+
+def _colores(paleta):
+    tab20 = matplotlib.colormaps['tab20'].colors
+    product_colors = {prod: tab20[i % 20] for i, prod in enumerate(paleta)}
+    product_colors['Otros'] = '#d3d3d3'
+    return product_colors
+
+# --- DIBUJO SOBRE UN EJE ---
+# 'pdf=True' reproduce la variante (más sobria) que se usa en el informe
+
+def _dibujar_barras(ax, spec, pdf=False):
+    colores = _colores(spec['paleta'])
+    if spec['orden'] == 'ingresos':
+        titulo = 'Unidades (Por Rentabilidad)' if pdf else 'Unidades (Ordenado por Rentabilidad)'
+    else:
+        titulo = 'Unidades (Por Volumen)' if pdf else 'Unidades (Ordenado por Volumen)'
+
+    ax.bar(spec['productos'], spec['valores'], color=[colores.get(p, '#333') for p in spec['productos']])
+    if pdf:
+        ax.set_title(titulo)
+    else:
+        ax.set_title(titulo, fontsize=10, weight='bold')
+        ax.set_xlabel('Productos', fontsize=9, color='#555')
+        ax.set_ylabel('Cantidad Vendida', fontsize=9, color='#555')
+    ax.tick_params(axis='x', rotation=45, labelsize=8)
+
+def _dibujar_tarta(ax, spec, pdf=False):
+    # Sin ejes X/Y
+    colores = _colores(spec['paleta'])
+    values = spec['values']
+    explode = [0.1] + [0]*(len(values)-1) if values else None
+    ax.pie(values, labels=spec['labels'], autopct='%1.1f%%', startangle=140,
+           explode=explode, shadow=not pdf,
+           colors=[colores.get(l, '#d3d3d3') for l in spec['labels']])
+    if pdf:
+        ax.set_title('Distribución de Ingresos')
+    else:
+        ax.set_title('Distribución Ingresos', fontsize=10, weight='bold')
+
+def _dibujar_pareto(ax, spec, pdf=False):
+    colores = _colores(spec['paleta'])
+    prods = spec['productos']
+    ax.bar(prods, spec['ingresos'], color=[colores.get(p, '#333') for p in prods])
+    if not pdf:
+        ax.set_xlabel('Productos', fontsize=9, color='#555')
+        ax.set_ylabel('Ingresos Totales (€)', fontsize=9, color='#555')
+
+    twin = ax.twinx()
+    twin.plot(prods, spec['acumulado'], color='red', marker='o', **({} if pdf else {'linewidth': 2}))
+    twin.axhline(80, color='gray', linestyle='--')
+    # Los productos a la izquierda de la línea suman el 80% de los ingresos
+    if spec.get('corte') is not None and spec['corte'] < len(prods) - 1:
+        ax.axvline(spec['corte'] + 0.5, color='gray', linestyle=':')
+    if pdf:
+        ax.set_title('Pareto')
+    else:
+        twin.set_ylabel('% Acumulado', fontsize=9, color='red')
+        ax.set_title('Pareto (80/20)', fontsize=10, weight='bold')
+    ax.tick_params(axis='x', rotation=45, labelsize=8)
+
+def _dibujar_timeline(ax, spec, pdf=False):
+    if pdf:
+        ax.plot(spec['fechas'], spec['valores'], marker='o', color='green')
+        ax.set_title('Evolución Temporal')
+    else:
+        ax.plot(spec['fechas'], spec['valores'], marker='o', linestyle='-', color='#2ca02c')
+        ax.set_title('Tendencia Temporal', fontsize=10, weight='bold')
+        ax.set_xlabel('Fecha de Venta', fontsize=9, color='#555')
+        periodo = {'semana': 'Semanal', 'mes': 'Mensual'}.get(spec.get('granularidad'), 'Diaria')
+        ax.set_ylabel(f'Facturación {periodo} (€)', fontsize=9, color='#555')
+    # Con semanas o meses la serie suele abarcar varios años
+    formato = {'semana': '%Y-%m-%d', 'mes': '%Y-%m'}.get(spec.get('granularidad'), '%m-%d')
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(formato))
+    ax.tick_params(axis='x', rotation=45)
+
+def _dibujar_producto(ax, spec, pdf=False):
+    ax.plot(spec['fechas'], spec['ingresos'], marker='o', linestyle='-', color='#0d6efd', linewidth=2)
+    ax.set_title(f"Evolución de Ventas: {spec['nombre']}", fontsize=12, weight='bold')
+    ax.set_ylabel('Ingresos (€)', fontsize=10)
+    ax.set_xlabel('Fecha', fontsize=10)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    ax.tick_params(axis='x', rotation=45, labelsize=8)
+    ax.grid(True, linestyle='--', alpha=0.6)
+
+DIBUJOS = {
+    'barras': _dibujar_barras,
+    'tarta': _dibujar_tarta,
+    'pareto': _dibujar_pareto,
+    'timeline': _dibujar_timeline,
+    'producto': _dibujar_producto,
+}
+
+# --- PÁGINAS DEL INFORME PDF ---
+
+def _dibujar_portada(fig, spec):
+    fig.text(0.5, 0.9, "Informe de Ventas\nGenerated by Docker & Python", ha='center', fontsize=24, weight='bold', color='#333')
+    fig.text(0.5, 0.85, f"Fecha: {spec['emitido'].strftime('%Y-%m-%d %H:%M')}", ha='center', fontsize=12, color='#666')
+
+    y_pos = 0.7
+    fig.text(0.5, y_pos, "RESUMEN EJECUTIVO", ha='center', fontsize=16, weight='bold', color='#0d6efd')
+    kpis = spec['kpis']
+    metrics = [
+        f"Ingresos Totales: {kpis['total_ingresos']} €",
+        f"Ticket Medio: {kpis['ticket_medio']} €",
+        f"Producto Top: {kpis['top_producto']}",
+        f"Total Ventas Registradas: {spec['total_ventas']}"
+    ]
+    for i, metric in enumerate(metrics):
+        fig.text(0.5, y_pos - 0.1 - (i*0.05), metric, ha='center', fontsize=14)
+
+    fig.text(0.5, 0.4, f"Filtros aplicados: Tiempo={spec['filtro_tiempo']} | Orden={spec['filtro_orden']}",
+             ha='center', fontsize=10, style='italic', color='gray')
+
+def _figura(spec):
+    if spec['tipo'] == 'portada':
+        fig = Figure(figsize=(8.5, 11))
+        _dibujar_portada(fig, spec)
+    elif spec['tipo'] == 'pagina':
+        # Página de informe con dos gráficos apilados
+        fig = Figure(figsize=(8.5, 11))
+        axes = fig.subplots(len(spec['graficos']), 1, squeeze=False)[:, 0]
+        for ax, sub in zip(axes, spec['graficos']):
+            DIBUJOS[sub['tipo']](ax, sub, pdf=True)
+        fig.tight_layout(pad=5.0)
+    else:
+        fig = Figure(figsize=(8, 4) if spec['tipo'] == 'producto' else (6, 4))
+        DIBUJOS[spec['tipo']](fig.subplots(), spec)
+    return fig
+
+def renderizar(spec, formato='png', dpi=None):
+    preparar_matplotlib()
+    fig = _figura(spec)
+    img = io.BytesIO()
+    if spec['tipo'] in ('portada', 'pagina'):
+        fig.savefig(img, format=formato, dpi=dpi)
+    else:
+        fig.savefig(img, format=formato, bbox_inches='tight', dpi=dpi)
+    return img.getvalue()
+
+def figura_pagina(spec):
+    # La página entera como Figure, para escribirla con PdfPages como página
+    # vectorial con texto seleccionable (ver graficos.pdf_en_streaming)
+    preparar_matplotlib()
+    return _figura(spec)
@@ -0,0 +1,119 @@
+import math
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+import cambios
+import resumen_materializado
+from cache_graficos import incrementar_version
+
+# --- VALIDACIÓN ---
+# Mismo esquema que el formulario de /agregar: producto, cantidad (int),
+# ingresos (float) y fecha ('YYYY-MM-DD' o fecha ISO completa). Las fechas con
+# zona horaria se guardan en UTC sin zona, como las guarda Mongo: así el día
+# del resumen materializado coincide con el de la fecha almacenada.
+
+class VentaInvalida(ValueError):
+    pass
+
+def _fecha(valor):
+    if not isinstance(valor, datetime):
+        valor = str(valor or '').strip()
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d')
+        except ValueError:
+            valor = datetime.fromisoformat(valor)
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor
+
+def validar_venta(datos, fecha_por_defecto=None):
+    producto = datos.get('producto')
+    if producto is not None and not isinstance(producto, str):
+        raise VentaInvalida(f"Producto no válido: {producto!r}")
+    producto = (producto or '').strip()
+    if not producto:
+        raise VentaInvalida("Falta el producto")
+    try:
+        cantidad = int(datos.get('cantidad'))
+    except (TypeError, ValueError, OverflowError):
+        raise VentaInvalida(f"Cantidad no válida: {datos.get('cantidad')!r}")
+    try:
+        ingresos = float(datos.get('ingresos'))
+    except (TypeError, ValueError):
+        raise VentaInvalida(f"Ingresos no válidos: {datos.get('ingresos')!r}")
+    # NaN o infinito romperían para siempre los $inc del resumen materializado
+    if not math.isfinite(ingresos):
+        raise VentaInvalida(f"Ingresos no válidos: {datos.get('ingresos')!r}")
+    try:
+        fecha = _fecha(datos.get('fecha'))
+    except (TypeError, ValueError):
+        if fecha_por_defecto is None:
+            raise VentaInvalida(f"Fecha no válida: {datos.get('fecha')!r}")
+        fecha = fecha_por_defecto
+    return {"producto": producto, "cantidad": cantidad, "ingresos": ingresos, "fecha": fecha}
+
+# --- ESCRITURAS SOBRE 'ventas' ---
+# Toda modificación pasa por aquí para que el resumen materializado, el
+# registro de cambios y la versión de los datos no se desincronicen nunca.
+
+def alta(db, venta):
+    venta['_modified'] = datetime.utcnow()
+    db['ventas'].insert_one(venta)
+    resumen_materializado.registrar_alta(db, venta)
+    cambios.registrar(db, 'alta', venta['_id'], venta)
+    incrementar_version(db)
+    return venta['_id']
+
+def altas(db, ventas):
+    # Alta masiva (ya validadas): una sola ida y vuelta por colección afectada
+    if not ventas:
+        return 0
+    ahora = datetime.utcnow()
+    for venta in ventas:
+        venta['_modified'] = ahora
+    try:
+        db['ventas'].insert_many(ventas, ordered=False)
+        insertadas = ventas
+    except BulkWriteError as e:
+        fallidas = {err['index'] for err in e.details.get('writeErrors', [])}
+        insertadas = [v for i, v in enumerate(ventas) if i not in fallidas]
+    resumen_materializado.registrar_altas(db, insertadas)
+    cambios.registrar_varios(db, [('alta', v['_id'], v) for v in insertadas])
+    incrementar_version(db)
+    return len(insertadas)
+
+def baja(db, venta_id):
+    borrada = db['ventas'].find_one_and_delete({'_id': ObjectId(venta_id)})
+    if borrada:
+        resumen_materializado.registrar_baja(db, borrada)
+        cambios.registrar(db, 'baja', borrada['_id'])
+        incrementar_version(db)
+    return borrada
+
+def cambio(db, venta_id, datos):
+    # Necesitamos los valores viejos para corregir el resumen materializado
+    datos = dict(datos, _modified=datetime.utcnow())
+    anterior = db['ventas'].find_one_and_update({'_id': ObjectId(venta_id)}, {'$set': datos},
+                                                return_document=ReturnDocument.BEFORE)
+    if anterior:
+        resumen_materializado.registrar_cambio(db, anterior, datos)
+        cambios.registrar(db, 'cambio', anterior['_id'], {**anterior, **datos})
+        incrementar_version(db)
+    return anterior
+
+def rellenar_fechas(db):
+    # Una sola vez (al arrancar): las ventas antiguas sin fecha reciben la de
+    # ahora, igual que el formulario, y las consultas ya no tienen que tratarlas
+    ids = [d['_id'] for d in db['ventas'].find({'fecha': None}, {'_id': 1})]
+    if not ids:
+        return 0
+    db['ventas'].update_many({'_id': {'$in': ids}, 'fecha': None},
+                             {'$set': {'fecha': datetime.now(), '_modified': datetime.utcnow()}})
+    cambios.registrar_varios(db, [('cambio', d['_id'], d) for d in db['ventas'].find({'_id': {'$in': ids}})])
+    # Sus contadores diarios dependían del momento en que se calcularon
+    resumen_materializado.reconstruir(db)
+    incrementar_version(db)
+    return len(ids)
@@ -0,0 +1,136 @@
+import os
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+# --- RENDERIZADO DE GRÁFICOS ---
+# Cada gráfico se describe con un "spec" (dict con datos planos, serializable)
+# que se dibuja en dibujo.py, en un proceso del pool o en este mismo. matplotlib
+# se importa ahí la primera vez que hace falta, no al cargar este módulo.
+
+PROCESOS = int(os.environ.get('GRAFICOS_PROCESOS', os.cpu_count() or 1))
+# Hasta este tamaño el PDF en curso se queda en memoria; a partir de ahí, a disco
+PDF_MEMORIA_MAX = int(os.environ.get('PDF_MEMORIA_MAX', 4 * 1024 * 1024))
+
+_pool = None
+_lock_pool = threading.Lock()
+
+def preparar_matplotlib():
+    # Importa matplotlib y deja listos estilo y caché de fuentes (initializer
+    # del pool y precarga en el maestro de gunicorn)
+    import dibujo
+    dibujo.preparar_matplotlib()
+
+def renderizar(spec, formato='png', dpi=None):
+    import dibujo
+    return dibujo.renderizar(spec, formato, dpi)
+
+def _pool_graficos():
+    global _pool
+    # Con el servidor de desarrollo (hilos) varias primeras peticiones pueden
+    # llegar a la vez: sin el lock cada una crearía su pool
+    with _lock_pool:
+        if _pool is None:
+            # 'spawn': los workers no heredan hilos ni conexiones del proceso web
+            _pool = ProcessPoolExecutor(max_workers=PROCESOS,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=preparar_matplotlib)
+    return _pool
+
+# --- API PARA LAS RUTAS ---
+
+def enviar(spec, formato='png', dpi=None):
+    # Devuelve un Future; con GRAFICOS_PROCESOS=0 se dibuja en este proceso
+    if PROCESOS <= 0:
+        futuro = Future()
+        futuro.set_result(renderizar(spec, formato, dpi))
+        return futuro
+    return _pool_graficos().submit(renderizar, spec, formato, dpi)
+
+def renderizar_grafico(spec, formato='png'):
+    return enviar(spec, formato).result()
+
+# --- INFORME PDF EN STREAMING ---
+# Las páginas se dibujan en este proceso, en el hilo de la petición, y no en
+# el pool: PdfPages solo escribe figuras de su propio proceso y lo caro es
+# precisamente ese savefig (el dibujo vectorial). Mandar la Figure desde un
+# worker no ahorraba nada, y unir PDFs de una página hechos en otros procesos
+# obligaría a reescribir objetos y tabla xref a mano. Limitación: un informe
+# usa un solo núcleo (~0,4 s por página); varios informes a la vez se reparten
+# entre los workers de gunicorn. Cada página se escribe en un fichero temporal
+# y sus bytes salen hacia el cliente en cuanto está guardada; solo fuentes y
+# tabla xref esperan al cierre, así que la memoria no crece con el informe.
+
+def _bytes_nuevos(fichero, posicion):
+    # Lo escrito desde 'posicion', dejando el fichero donde estaba
+    fin = fichero.tell()
+    fichero.seek(posicion)
+    datos = fichero.read(fin - posicion)
+    fichero.seek(fin)
+    return datos
+
+def pdf_en_streaming(specs):
+    # specs puede ser un generador: cada página se construye cuando toca
+    import dibujo
+    from matplotlib.backends.backend_pdf import PdfPages
+    dibujo.preparar_matplotlib()
+    with tempfile.SpooledTemporaryFile(max_size=PDF_MEMORIA_MAX) as destino:
+        enviado = 0
+        with PdfPages(destino) as pdf:
+            for spec in specs:
+                pdf.savefig(dibujo.figura_pagina(spec))
+                datos = _bytes_nuevos(destino, enviado)
+                enviado += len(datos)
+                yield datos
+        yield _bytes_nuevos(destino, enviado)
+
+# --- SPECS A PARTIR DE UN ResumenVentas ---
+
+def spec_barras(resumen, filtro_orden, paleta):
+    productos, valores = resumen.barras(filtro_orden)
+    return {'tipo': 'barras', 'orden': filtro_orden, 'productos': productos, 'valores': valores, 'paleta': paleta}
+
+def spec_tarta(resumen, paleta):
+    labels, values = resumen.tarta()
+    return {'tipo': 'tarta', 'labels': labels, 'values': values, 'paleta': paleta}
+
+def spec_pareto(resumen, paleta):
+    return dict(resumen.pareto(), tipo='pareto', paleta=paleta)
+
+def spec_timeline(resumen):
+    fechas, valores = resumen.timeline()
+    return {'tipo': 'timeline', 'fechas': fechas, 'valores': valores, 'granularidad': resumen.granularidad}
+
+def spec_producto(nombre, ventas_prod):
+    # ventas_prod en orden ascendente (antiguo -> nuevo)
+    return {'tipo': 'producto', 'nombre': nombre,
+            'fechas': [v['fecha'] for v in ventas_prod],
+            'ingresos': [v['ingresos'] for v in ventas_prod]}
+
+def specs_informe(resumen, paleta, filtro_tiempo, filtro_orden):
+    return [
+        {'tipo': 'portada', 'kpis': resumen.kpis(), 'total_ventas': resumen.total_ventas,
+         'emitido': datetime.now(), 'filtro_tiempo': filtro_tiempo, 'filtro_orden': filtro_orden},
+        {'tipo': 'pagina', 'graficos': [spec_barras(resumen, filtro_orden, paleta), spec_tarta(resumen, paleta)]},
+        {'tipo': 'pagina', 'graficos': [spec_pareto(resumen, paleta), spec_timeline(resumen)]},
+    ]
+
+def spec_serie_producto(nombre, serie):
+    # serie de agregados.serie_producto: un punto por día
+    return {'tipo': 'producto', 'nombre': nombre,
+            'fechas': [datetime.strptime(d['_id'], '%Y-%m-%d') for d in serie],
+            'ingresos': [d['ingresos'] for d in serie]}
+
+def specs_detalle(productos, serie_de):
+    # Páginas opcionales de detalle: evolución diaria de cada producto, dos por
+    # página. serie_de(nombre) se llama de forma perezosa, cuando la página
+    # entra en la ventana de render, y trae un punto por día (no cada venta).
+    productos = iter(productos)
+    while True:
+        pareja = list(islice(productos, 2))
+        if not pareja:
+            return
+        yield {'tipo': 'pagina', 'graficos': [spec_serie_producto(p, serie_de(p)) for p in pareja]}
@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+# --- SERVIDOR DE PRODUCCIÓN (gunicorn "app:create_app()") ---
+# Varios procesos worker en vez del servidor de desarrollo de Flask: el trabajo
+# de matplotlib usa CPU y con un solo proceso se queda en un núcleo.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+# Unos pocos hilos por worker cubren las esperas a Mongo y al pool de gráficos
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_HILOS', 4))
+# El PDF con detalle por producto puede tardar en generarse entero
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+accesslog = '-'
+
+# La app (y matplotlib, estilo y caché de fuentes) se cargan una vez en el
+# maestro y los workers lo heredan por fork. Mongo no: conexion.py abre el
+# cliente dentro de cada worker.
+preload_app = True
+
+# Los workers ya reparten la CPU: por defecto cada uno dibuja en su propio
+# proceso en lugar de levantar otro pool de cpu_count procesos
+os.environ.setdefault('GRAFICOS_PROCESOS', '0')
+
+# Cada worker tiene sus propios histogramas de /metrics: se vuelcan a este
+# directorio y /metrics los suma todos (metricas.py). Los gauges (caché de
+# gráficos, conexiones de Mongo) siguen siendo los del worker que responde.
+os.environ.setdefault('METRICAS_DIR', tempfile.mkdtemp(prefix='metricas_'))
+
+def on_starting(server):
+    import graficos
+    import metricas
+    graficos.preparar_matplotlib()
+    metricas.limpiar_directorio()
+
+def post_worker_init(worker):
+    # Sin bloquear ni lanzar: con Mongo caído el worker arranca igual y /readyz
+    # responde 503 hasta que el arranque termina (app.iniciar_en_segundo_plano)
+    import app
+    app.iniciar_en_segundo_plano()
@@ -0,0 +1,91 @@
+import csv
+import json
+import os
+
+import escrituras
+from backup import por_lotes
+
+# --- INGESTA MASIVA (CSV / NDJSON) ---
+# Las filas se leen del flujo de entrada sin cargarlo entero, se validan con
+# el mismo esquema que /agregar y se insertan por lotes con insert_many.
+# Se devuelve un informe por lote con las filas rechazadas.
+
+LOTE = int(os.environ.get('INGESTA_LOTE', 1000))
+LOTE_MAXIMO = 10000
+MAX_ERRORES_POR_LOTE = 100
+
+def formato_desde_tipo(content_type, nombre=''):
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type or nombre.endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+def _lineas(flujo):
+    # Se decodifica línea a línea: un error de codificación aparece en su fila
+    # y no al leer el bloque de 8 KB que la contiene
+    for n, linea in enumerate(flujo):
+        yield linea.decode('utf-8-sig' if n == 0 else 'utf-8')
+
+def _leer_csv(flujo):
+    filas = csv.DictReader(_lineas(flujo))
+    n = 1                                   # la 1 es la cabecera
+    while True:
+        n += 1
+        try:
+            fila = next(filas)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # El lector sigue en la línea siguiente
+            yield n, escrituras.VentaInvalida(f"CSV no válido: {e}")
+            continue
+        except UnicodeDecodeError:
+            # Sin saber dónde acaba la fila no se puede seguir leyendo
+            yield n, escrituras.VentaInvalida("Codificación no válida (se espera UTF-8); se deja de leer aquí")
+            return
+        yield n, fila
+
+def _leer_ndjson(flujo):
+    # Línea a línea en binario: una línea mal codificada es solo una fila errónea
+    for n, linea in enumerate(flujo, start=1):
+        try:
+            linea = linea.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            yield n, escrituras.VentaInvalida("Codificación no válida (se espera UTF-8)")
+            continue
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as e:
+            fila = escrituras.VentaInvalida(f"JSON no válido: {e}")
+        yield n, fila if isinstance(fila, (dict, Exception)) else escrituras.VentaInvalida("Se esperaba un objeto")
+
+def leer_filas(flujo, formato):
+    # flujo binario; devuelve (número de fila, dict | error)
+    if formato == 'csv':
+        return _leer_csv(flujo)
+    return _leer_ndjson(flujo)
+
+def importar(db, filas, lote=LOTE):
+    informe = {'lotes': [], 'total_insertadas': 0, 'total_errores': 0}
+    for i, bloque in enumerate(por_lotes(filas, lote), start=1):
+        validas, errores = [], []
+        for n, fila in bloque:
+            try:
+                if isinstance(fila, Exception):
+                    raise fila
+                validas.append(escrituras.validar_venta(fila))
+            except escrituras.VentaInvalida as e:
+                errores.append({'fila': n, 'error': str(e)})
+        insertadas = escrituras.altas(db, validas)
+        informe['lotes'].append({
+            'lote': i,
+            'filas': len(bloque),
+            'insertadas': insertadas,
+            'errores': len(errores) + len(validas) - insertadas,
+            'detalle_errores': errores[:MAX_ERRORES_POR_LOTE],
+        })
+        informe['total_insertadas'] += insertadas
+        informe['total_errores'] += len(errores) + len(validas) - insertadas
+    return informe
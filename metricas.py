@@ -0,0 +1,250 @@
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+# --- INSTRUMENTACIÓN ---
+# Cronómetros por etapa (fetch, aggregate, render:<gráfico>, template...) que
+# se acumulan en histogramas por ruta y se exponen en /metrics con el formato
+# de texto de Prometheus. Cada respuesta lleva además una cabecera
+# Server-Timing con el desglose de esa petición.
+#
+# Con PERFIL_HABILITADO=1 (o en modo debug), añadir ?profile=1 a cualquier URL
+# devuelve el informe de cProfile de esa petición en vez de la respuesta.
+#
+# Con varios procesos (workers de gunicorn) cada uno tiene sus histogramas y
+# /metrics lo atiende uno cualquiera. Si METRICAS_DIR está definido, cada
+# proceso vuelca los suyos a <METRICAS_DIR>/<pid>-<inicio>.json cada
+# METRICAS_INTERVALO segundos (y justo antes de exportar) y /metrics suma los
+# de todos; también los de workers ya terminados, para que los contadores no
+# retrocedan cuando gunicorn recicla uno. Lo de los demás workers puede llegar
+# con hasta METRICAS_INTERVALO segundos de retraso.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PERFIL_HABILITADO = os.environ.get('PERFIL_HABILITADO') == '1'
+METRICAS_DIR = os.environ.get('METRICAS_DIR')
+METRICAS_INTERVALO = float(os.environ.get('METRICAS_INTERVALO', 5))
+
+class Histograma:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}   # etiquetas -> [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, etiquetas, valor):
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def volcar(self):
+        with self._lock:
+            return [[list(etiquetas), list(conteos), suma, total]
+                    for etiquetas, (conteos, suma, total) in self._series.items()]
+
+    def sumar(self, volcado):
+        with self._lock:
+            for etiquetas, conteos, suma, total in volcado:
+                serie = self._series.setdefault(tuple(etiquetas), [[0] * len(self.buckets), 0.0, 0])
+                serie[0] = [a + b for a, b in zip(serie[0], conteos)]
+                serie[1] += suma
+                serie[2] += total
+
+    def exportar(self, nombre, ayuda, claves):
+        lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for etiquetas, (conteos, suma, total) in series:
+                base = ','.join(f'{k}="{_escapar(v)}"' for k, v in zip(claves, etiquetas))
+                for limite, n in zip(self.buckets, conteos):
+                    lineas.append(f'{nombre}_bucket{{{base},le="{limite}"}} {n}')
+                lineas.append(f'{nombre}_bucket{{{base},le="+Inf"}} {total}')
+                lineas.append(f'{nombre}_sum{{{base}}} {suma:.6f}')
+                lineas.append(f'{nombre}_count{{{base}}} {total}')
+        return lineas
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+peticiones = Histograma()
+etapas = Histograma()
+# Cuánto espera una operación hasta tener una conexión del pool de Mongo
+espera_pool = Histograma(buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+_HISTOGRAMAS = {'peticiones': peticiones, 'etapas': etapas, 'espera_pool': espera_pool}
+
+@contextmanager
+def etapa(nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        etapas.observar((request.endpoint or 'desconocido', nombre), duracion)
+        desglose = g.setdefault('etapas', {})
+        desglose[nombre] = desglose.get(nombre, 0) + duracion
+
+def _antes():
+    g.inicio_peticion = time.perf_counter()
+    if request.args.get('profile') == '1' and (PERFIL_HABILITADO or _app_debug()):
+        g.perfil = cProfile.Profile()
+        g.perfil.enable()
+
+def _despues(respuesta):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is None:
+        return respuesta
+    total = time.perf_counter() - inicio
+    if METRICAS_DIR:
+        _fichero_proceso()
+    peticiones.observar((request.endpoint or 'desconocido', request.method, str(respuesta.status_code)), total)
+
+    desglose = g.get('etapas', {})
+    partes = [f'{n.replace(":", "-")};dur={d * 1000:.1f}' for n, d in desglose.items()]
+    partes.append(f'total;dur={total * 1000:.1f}')
+    respuesta.headers['Server-Timing'] = ', '.join(partes)
+
+    perfil = g.pop('perfil', None)
+    if perfil is not None:
+        perfil.disable()
+        return _informe_perfil(perfil, desglose, total)
+    return respuesta
+
+def _informe_perfil(perfil, desglose, total):
+    salida = io.StringIO()
+    salida.write(f"Petición: {request.method} {request.full_path}\n")
+    salida.write(f"Total: {total * 1000:.1f} ms\n\nEtapas:\n")
+    for nombre, duracion in desglose.items():
+        salida.write(f"  {nombre:<24} {duracion * 1000:>9.1f} ms\n")
+    salida.write("\n")
+    pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(40)
+    return Response(salida.getvalue(), mimetype='text/plain')
+
+def _app_debug():
+    from flask import current_app
+    return current_app.debug
+
+# --- POOL DE CONEXIONES DE MONGO ---
+# Los eventos de checkout se emiten en el hilo que pide la conexión, así que
+# el inicio de la espera se guarda por hilo.
+
+class OyentePool(monitoring.ConnectionPoolListener):
+
+    def __init__(self):
+        self._hilo = threading.local()
+        self._lock = threading.Lock()
+        self.abiertas = 0
+        self.en_uso = 0
+
+    def _cambiar(self, atributo, delta):
+        with self._lock:
+            setattr(self, atributo, getattr(self, atributo) + delta)
+
+    def connection_check_out_started(self, event):
+        self._hilo.inicio = time.perf_counter()
+
+    def _fin_espera(self, resultado):
+        inicio = getattr(self._hilo, 'inicio', None)
+        if inicio is not None:
+            self._hilo.inicio = None
+            espera_pool.observar((resultado,), time.perf_counter() - inicio)
+
+    def connection_checked_out(self, event):
+        self._fin_espera('ok')
+        self._cambiar('en_uso', 1)
+
+    def connection_check_out_failed(self, event):
+        self._fin_espera(str(event.reason))
+
+    def connection_checked_in(self, event):
+        self._cambiar('en_uso', -1)
+
+    def connection_created(self, event):
+        self._cambiar('abiertas', 1)
+
+    def connection_closed(self, event):
+        self._cambiar('abiertas', -1)
+
+    # Eventos que no se usan
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+# --- AGREGACIÓN ENTRE PROCESOS (METRICAS_DIR) ---
+
+_volcado = {'pid': None, 'fichero': None}
+_lock_volcado = threading.Lock()
+
+def _fichero_proceso():
+    # Fichero de este proceso; el primero que lo pide tras el fork arranca el
+    # hilo que lo vuelca periódicamente
+    with _lock_volcado:
+        if _volcado['pid'] != os.getpid():
+            os.makedirs(METRICAS_DIR, exist_ok=True)
+            fichero = os.path.join(METRICAS_DIR, f'{os.getpid()}-{time.time_ns()}.json')
+            _volcado.update(pid=os.getpid(), fichero=fichero)
+            threading.Thread(target=_bucle_volcado, args=(fichero,), name='metricas', daemon=True).start()
+        return _volcado['fichero']
+
+def _volcar(fichero):
+    # Escritura atómica: quien exporta nunca lee un fichero a medias
+    temporal = f'{fichero}.tmp'
+    with open(temporal, 'w') as f:
+        json.dump({nombre: h.volcar() for nombre, h in _HISTOGRAMAS.items()}, f)
+    os.replace(temporal, fichero)
+
+def _bucle_volcado(fichero):
+    while True:
+        time.sleep(METRICAS_INTERVALO)
+        try:
+            _volcar(fichero)
+        except OSError:
+            pass
+
+def _histogramas_agregados():
+    _volcar(_fichero_proceso())
+    agregados = {nombre: Histograma(h.buckets) for nombre, h in _HISTOGRAMAS.items()}
+    for fichero in glob.glob(os.path.join(METRICAS_DIR, '*.json')):
+        try:
+            with open(fichero) as f:
+                volcado = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for nombre, h in agregados.items():
+            h.sumar(volcado.get(nombre, []))
+    return agregados
+
+def limpiar_directorio():
+    # Al arrancar el servidor: los ficheros de una ejecución anterior no cuentan
+    for fichero in glob.glob(os.path.join(METRICAS_DIR, '*.json*')):
+        os.remove(fichero)
+
+def instalar(app):
+    app.before_request(_antes)
+    app.after_request(_despues)
+
+def exportar_prometheus(extra=()):
+    h = _histogramas_agregados() if METRICAS_DIR else _HISTOGRAMAS
+    lineas = h['peticiones'].exportar('app_peticion_segundos', 'Duración de las peticiones HTTP',
+                                 ('ruta', 'metodo', 'estado'))
+    lineas += h['etapas'].exportar('app_etapa_segundos', 'Duración de cada etapa dentro de una petición',
+                              ('ruta', 'etapa'))
+    lineas += h['espera_pool'].exportar('app_mongo_espera_pool_segundos',
+                                   'Espera hasta obtener una conexión del pool de Mongo', ('resultado',))
+    lineas += list(extra)
+    return '\n'.join(lineas) + '\n'
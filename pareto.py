@@ -0,0 +1,56 @@
+from bisect import bisect_left
+from itertools import accumulate
+
+# --- ANÁLISIS DE PARETO ---
+# Antes el % acumulado se calculaba con sum(ingr[:i+1]) para cada producto,
+# es decir O(n²). Aquí es una suma acumulada O(n) y el corte del 80% se busca
+# por bisección sobre la serie (que es creciente).
+
+UMBRAL_NUMPY = 5000
+# Barras por gráfico (barras y Pareto); el resto va a 'Otros'. Con miles de
+# productos dibujar una barra y una etiqueta por cada uno tarda segundos.
+TOP_N_GRAFICOS = 15
+
+def ordenar_por_valor(valores_por_clave):
+    return sorted(valores_por_clave.items(), key=lambda x: x[1], reverse=True)
+
+def porcentaje_acumulado(valores):
+    total = sum(valores)
+    if not total:
+        # Sin ingresos no hay reparto: serie a cero, del mismo largo que los productos
+        return [0.0] * len(valores)
+    if len(valores) >= UMBRAL_NUMPY:
+        # Import diferido: numpy solo compensa con catálogos grandes y cargarlo
+        # cuesta más que un cálculo normal
+        import numpy as np
+        return (np.cumsum(np.asarray(valores, dtype=float)) / total * 100).tolist()
+    return [parcial / total * 100 for parcial in accumulate(valores)]
+
+def indice_corte(acumulado, umbral=80.0):
+    # Primer producto con el que se alcanza el umbral (len si no se alcanza)
+    return bisect_left(acumulado, umbral)
+
+def truncar_top_n(items, n=5, etiqueta='Otros'):
+    # items ya ordenados de mayor a menor; el resto se agrupa en 'Otros'
+    if len(items) <= n:
+        return list(items)
+    top = list(items[:n])
+    top.append((etiqueta, sum(item[1] for item in items[n:])))
+    return top
+
+def calcular_pareto(valores_por_clave, umbral=80.0, top_n=None):
+    # El acumulado y el corte salen de la serie completa; con top_n solo se
+    # recortan las barras, y 'Otros' lleva la curva hasta el final (100%)
+    ordenados = ordenar_por_valor(valores_por_clave)
+    acumulado = porcentaje_acumulado([x[1] for x in ordenados])
+    corte = indice_corte(acumulado, umbral)
+    if top_n is not None and len(ordenados) > top_n:
+        ordenados = truncar_top_n(ordenados, top_n)
+        acumulado = acumulado[:top_n] + acumulado[-1:]
+        corte = min(corte, top_n)
+    return {
+        'productos': [x[0] for x in ordenados],
+        'ingresos': [x[1] for x in ordenados],
+        'acumulado': acumulado,
+        'corte': corte,
+    }
@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, UpdateOne
+
+from agregados import ResumenVentas
+
+# --- RESUMEN MATERIALIZADO ---
+# 'ventas_resumen' guarda contadores por producto, por día y globales. Las
+# rutas que escriben en 'ventas' aplican deltas con $inc, así que leer el
+# dashboard cuesta O(productos + días) aunque haya millones de ventas.
+#
+#   {tipo: 'producto', clave: <nombre>,     ventas, cantidad, ingresos}
+#   {tipo: 'dia',      clave: 'YYYY-MM-DD', ventas, cantidad, ingresos}
+#   {tipo: 'global',   clave: None,         ventas, cantidad, ingresos}
+
+COLECCION = 'ventas_resumen'
+
+def _clave_dia(venta):
+    return (venta.get('fecha') or datetime.utcnow()).strftime('%Y-%m-%d')
+
+def _operaciones(venta, signo):
+    delta = {'$inc': {'ventas': signo,
+                      'cantidad': signo * venta['cantidad'],
+                      'ingresos': signo * venta['ingresos']}}
+    return [
+        UpdateOne({'tipo': 'producto', 'clave': venta['producto']}, delta, upsert=True),
+        UpdateOne({'tipo': 'dia', 'clave': _clave_dia(venta)}, delta, upsert=True),
+        UpdateOne({'tipo': 'global', 'clave': None}, delta, upsert=True),
+    ]
+
+def _limpiar_vacios(db):
+    # Un producto/día sin ventas no debe aparecer en los gráficos
+    db[COLECCION].delete_many({'tipo': {'$ne': 'global'}, 'ventas': {'$lte': 0}})
+
+def crear_indices(db):
+    db[COLECCION].create_index([('tipo', ASCENDING), ('clave', ASCENDING)], unique=True)
+
+def registrar_alta(db, venta):
+    db[COLECCION].bulk_write(_operaciones(venta, 1), ordered=False)
+
+def registrar_altas(db, ventas):
+    # Los deltas se suman primero en Python: una operación por producto/día
+    deltas = {}
+    for venta in ventas:
+        for clave in (('producto', venta['producto']), ('dia', _clave_dia(venta)), ('global', None)):
+            d = deltas.setdefault(clave, [0, 0, 0])
+            d[0] += 1
+            d[1] += venta['cantidad']
+            d[2] += venta['ingresos']
+    if deltas:
+        db[COLECCION].bulk_write([
+            UpdateOne({'tipo': tipo, 'clave': clave},
+                      {'$inc': {'ventas': n, 'cantidad': cantidad, 'ingresos': ingresos}}, upsert=True)
+            for (tipo, clave), (n, cantidad, ingresos) in deltas.items()
+        ], ordered=False)
+
+def registrar_baja(db, venta):
+    db[COLECCION].bulk_write(_operaciones(venta, -1), ordered=False)
+    _limpiar_vacios(db)
+
+def registrar_cambio(db, anterior, nueva):
+    # Primero se descuentan los valores viejos y luego se suman los nuevos
+    # (puede cambiar el producto o el día, no solo las cifras)
+    db[COLECCION].bulk_write(_operaciones(anterior, -1) + _operaciones(nueva, 1), ordered=True)
+    _limpiar_vacios(db)
+
+def leer_resumen(db):
+    return ResumenVentas.desde_materializado(db[COLECCION].find({}, {'_id': 0}))
+
+def totales_producto(db, nombre):
+    return db[COLECCION].find_one({'tipo': 'producto', 'clave': nombre}, {'_id': 0})
+
+# --- RECONSTRUCCIÓN Y VERIFICACIÓN ---
+
+def _pipeline_desde_ventas():
+    fecha = {'$ifNull': ['$fecha', '$$NOW']}
+    acumular = {'ventas': {'$sum': 1}, 'cantidad': {'$sum': '$cantidad'}, 'ingresos': {'$sum': '$ingresos'}}
+    proyectar = {'_id': 0, 'tipo': 1, 'clave': '$_id', 'ventas': 1, 'cantidad': 1, 'ingresos': 1}
+    return [
+        {'$facet': {
+            'producto': [{'$group': {'_id': '$producto', **acumular}},
+                         {'$addFields': {'tipo': 'producto'}}, {'$project': proyectar}],
+            'dia': [{'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': fecha}}, **acumular}},
+                    {'$addFields': {'tipo': 'dia'}}, {'$project': proyectar}],
+            'global': [{'$group': {'_id': None, **acumular}},
+                       {'$addFields': {'tipo': 'global'}}, {'$project': proyectar}],
+        }},
+        {'$project': {'docs': {'$concatArrays': ['$producto', '$dia', '$global']}}},
+        {'$unwind': '$docs'},
+        {'$replaceRoot': {'newRoot': '$docs'}},
+    ]
+
+def calcular_desde_ventas(db):
+    return list(db['ventas'].aggregate(_pipeline_desde_ventas()))
+
+def reconstruir(db):
+    # Se escribe en una colección temporal y se renombra: los lectores nunca
+    # ven el resumen a medio construir. Las escrituras que lleguen durante la
+    # reconstrucción se pierden, así que conviene lanzarlo sin tráfico.
+    docs = calcular_desde_ventas(db)
+    temporal = db[COLECCION + '_tmp']
+    temporal.drop()
+    if docs:
+        temporal.insert_many(docs)
+        temporal.create_index([('tipo', ASCENDING), ('clave', ASCENDING)], unique=True)
+        temporal.rename(COLECCION, dropTarget=True)
+    else:
+        db[COLECCION].delete_many({})
+    return len(docs)
+
+def verificar(db, tolerancia=1e-9):
+    # Devuelve [(clave, esperado, actual)] con las entradas que no cuadran
+    cero = {'ventas': 0, 'cantidad': 0, 'ingresos': 0}
+    esperado = {(d['tipo'], d['clave']): d for d in calcular_desde_ventas(db)}
+    actual = {(d['tipo'], d['clave']): d for d in db[COLECCION].find({}, {'_id': 0})}
+    diferencias = []
+    for clave in sorted(set(esperado) | set(actual), key=repr):
+        e, a = esperado.get(clave, cero), actual.get(clave, cero)
+        if e['ventas'] != a['ventas'] or e['cantidad'] != a['cantidad'] \
+                or abs(e['ingresos'] - a['ingresos']) > tolerancia * max(1, abs(e['ingresos'])):
+            diferencias.append((clave, e, a))
+    return diferencias
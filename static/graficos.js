@@ -0,0 +1,102 @@
+// Gráficos dibujados en el navegador (modo=cliente) con Chart.js a partir de
+// /api/dashboard y /api/producto/<nombre>. Los colores son los mismos que en
+// los PNG del servidor (tab20 en el orden de la paleta de productos).
+
+const TAB20 = ['#1f77b4', '#aec7e8', '#ff7f0e', '#ffbb78', '#2ca02c', '#98df8a', '#d62728', '#ff9896',
+               '#9467bd', '#c5b0d5', '#8c564b', '#c49c94', '#e377c2', '#f7b6d2', '#7f7f7f', '#c7c7c7',
+               '#bcbd22', '#dbdb8d', '#17becf', '#9edae5'];
+
+function colores(paleta) {
+    const mapa = {};
+    paleta.forEach((producto, i) => { mapa[producto] = TAB20[i % 20]; });
+    mapa['Otros'] = '#d3d3d3';
+    return mapa;
+}
+
+function titulo(texto) {
+    return {display: true, text: texto, font: {weight: 'bold'}};
+}
+
+async function pedirJson(url) {
+    // El navegador revalida con If-None-Match: si no hay cambios, 304 sin cuerpo
+    const respuesta = await fetch(url, {headers: {'Accept': 'application/json'}});
+    if (!respuesta.ok) {
+        throw new Error(`${url}: ${respuesta.status}`);
+    }
+    return respuesta.json();
+}
+
+async function dibujarDashboard(url) {
+    const datos = await pedirJson(url);
+    if (!datos.kpis) {
+        return;
+    }
+    const color = colores(datos.paleta);
+
+    const barras = datos.barras;
+    new Chart(document.getElementById('grafico-barras'), {
+        type: 'bar',
+        data: {
+            labels: barras.productos,
+            datasets: [{label: 'Cantidad Vendida', data: barras.unidades,
+                        backgroundColor: barras.productos.map(p => color[p] || '#333')}],
+        },
+        options: {plugins: {legend: {display: false},
+                            title: titulo(barras.orden === 'ingresos' ? 'Unidades (Ordenado por Rentabilidad)'
+                                                                      : 'Unidades (Ordenado por Volumen)')}},
+    });
+
+    const tarta = datos.tarta;
+    new Chart(document.getElementById('grafico-tarta'), {
+        type: 'pie',
+        data: {
+            labels: tarta.etiquetas,
+            datasets: [{data: tarta.ingresos, backgroundColor: tarta.etiquetas.map(p => color[p] || '#d3d3d3')}],
+        },
+        options: {plugins: {title: titulo('Distribución Ingresos')}},
+    });
+
+    const pareto = datos.pareto;
+    new Chart(document.getElementById('grafico-pareto'), {
+        data: {
+            labels: pareto.productos,
+            datasets: [
+                {type: 'bar', label: 'Ingresos Totales (€)', data: pareto.ingresos, yAxisID: 'y',
+                 backgroundColor: pareto.productos.map(p => color[p] || '#333')},
+                {type: 'line', label: '% Acumulado', data: pareto.acumulado, yAxisID: 'acumulado',
+                 borderColor: 'red', backgroundColor: 'red'},
+                {type: 'line', label: '80%', data: pareto.productos.map(() => 80), yAxisID: 'acumulado',
+                 borderColor: 'gray', borderDash: [6, 4], pointRadius: 0},
+            ],
+        },
+        options: {
+            scales: {acumulado: {position: 'right', min: 0, max: 100, grid: {drawOnChartArea: false}}},
+            plugins: {title: titulo('Pareto (80/20)')},
+        },
+    });
+
+    const timeline = datos.timeline;
+    const periodo = {semana: 'Semanal', mes: 'Mensual'}[timeline.granularidad] || 'Diaria';
+    new Chart(document.getElementById('grafico-timeline'), {
+        type: 'line',
+        data: {
+            labels: timeline.periodos,
+            datasets: [{label: `Facturación ${periodo} (€)`, data: timeline.ingresos,
+                        borderColor: '#2ca02c', backgroundColor: '#2ca02c'}],
+        },
+        options: {plugins: {legend: {display: false}, title: titulo('Tendencia Temporal')}},
+    });
+}
+
+async function dibujarProducto(url) {
+    const datos = await pedirJson(url);
+    new Chart(document.getElementById('grafico-producto'), {
+        type: 'line',
+        data: {
+            labels: datos.serie.dias,
+            datasets: [{label: 'Ingresos (€)', data: datos.serie.ingresos, borderWidth: 2,
+                        borderColor: '#0d6efd', backgroundColor: '#0d6efd'}],
+        },
+        options: {plugins: {legend: {display: false}, title: titulo(`Evolución de Ventas: ${datos.nombre}`)}},
+    });
+}
@@ -0,0 +1,127 @@
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# --- TAREAS EN SEGUNDO PLANO ---
+# Cola persistente en la colección 'tareas'. Las rutas encolan y responden al
+# momento; un hilo de fondo ejecuta las tareas. Un índice único parcial sobre
+# (clave, estado) de las tareas activas garantiza, incluso con varios
+# procesos, que por clave haya como mucho una pendiente y una en ejecución:
+# una ráfaga de clics se agrupa en una sola tarea pendiente.
+
+COLECCION = 'tareas'
+ESPERA = float(os.environ.get('TAREAS_ESPERA', 2))
+MAX_MINUTOS_EJECUCION = int(os.environ.get('TAREAS_MAX_MINUTOS', 30))
+
+_aviso = threading.Event()
+
+def crear_indices(db):
+    db[COLECCION].create_index([('clave', ASCENDING), ('estado', ASCENDING)], unique=True,
+                               partialFilterExpression={'activa': True}, name='una_activa_por_estado')
+    db[COLECCION].create_index([('estado', ASCENDING), ('creada', ASCENDING)])
+
+def encolar(db, tipo, clave=None):
+    # Devuelve (id, nueva); nueva=False si se ha agrupado con una ya pendiente
+    doc = {'tipo': tipo, 'clave': clave or tipo, 'estado': 'pendiente', 'activa': True,
+           'creada': datetime.utcnow()}
+    for _ in range(3):
+        try:
+            tarea_id = db[COLECCION].insert_one(dict(doc)).inserted_id
+        except DuplicateKeyError:
+            existente = db[COLECCION].find_one({'clave': doc['clave'], 'estado': 'pendiente', 'activa': True})
+            if existente:
+                return existente['_id'], False
+            # La pendiente acaba de pasar a ejecución: se reintenta
+            continue
+        _aviso.set()
+        return tarea_id, True
+    raise RuntimeError(f"No se pudo encolar la tarea '{tipo}'")
+
+def _reclamar(db):
+    for pendiente in db[COLECCION].find({'estado': 'pendiente', 'activa': True}).sort('creada', ASCENDING):
+        try:
+            tarea = db[COLECCION].find_one_and_update(
+                {'_id': pendiente['_id'], 'estado': 'pendiente'},
+                {'$set': {'estado': 'ejecutando', 'iniciada': datetime.utcnow(), 'proceso': os.getpid()}},
+                return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Otra tarea con la misma clave se está ejecutando
+            continue
+        if tarea:
+            return tarea
+    return None
+
+def _terminar(db, tarea_id, exito, mensaje):
+    db[COLECCION].update_one({'_id': tarea_id},
+                             {'$set': {'estado': 'completada' if exito else 'fallida',
+                                       'mensaje': mensaje, 'terminada': datetime.utcnow()},
+                              '$unset': {'activa': ''}})
+
+def recuperar_huerfanas(db):
+    # Tareas que se quedaron "ejecutando" porque su proceso murió
+    limite = datetime.utcnow() - timedelta(minutes=MAX_MINUTOS_EJECUCION)
+    db[COLECCION].update_many({'estado': 'ejecutando', 'activa': True, 'iniciada': {'$lt': limite}},
+                              {'$set': {'estado': 'fallida', 'mensaje': 'Interrumpida', 'terminada': datetime.utcnow()},
+                               '$unset': {'activa': ''}})
+
+def consultar(db, tarea_id):
+    try:
+        oid = ObjectId(tarea_id)
+    except (InvalidId, TypeError):
+        return None
+    tarea = db[COLECCION].find_one({'_id': oid}, {'activa': 0, 'proceso': 0})
+    if tarea:
+        tarea['id'] = str(tarea.pop('_id'))
+    return tarea
+
+def _bucle(db, manejadores):
+    while True:
+        try:
+            recuperar_huerfanas(db)
+            tarea = _reclamar(db)
+        except Exception:
+            traceback.print_exc()
+            tarea = None
+        if tarea is None:
+            _aviso.wait(ESPERA)
+            _aviso.clear()
+            continue
+        try:
+            exito, mensaje = manejadores[tarea['tipo']]()
+        except Exception as e:
+            exito, mensaje = False, str(e)
+        _terminar(db, tarea['_id'], exito, mensaje)
+
+def iniciar_worker(db, manejadores):
+    hilo = threading.Thread(target=_bucle, args=(db, manejadores), name='tareas', daemon=True)
+    hilo.start()
+    return hilo
+
+# --- BLOQUEOS ---
+# Exclusión mutua entre procesos (p. ej. varios workers de gunicorn arrancando a
+# la vez) con un documento en 'meta'. Caduca solo si su dueño muere sin liberarlo.
+
+def adquirir_bloqueo(db, nombre, segundos=600):
+    ahora = datetime.utcnow()
+    dueno = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        # El propio dueño puede volver a tomarlo (p. ej. al reintentar un
+        # arranque que falló sin poder liberarlo)
+        db['meta'].update_one({'_id': f'bloqueo:{nombre}', '$or': [{'expira': {'$lt': ahora}}, {'dueno': dueno}]},
+                              {'$set': {'expira': ahora + timedelta(seconds=segundos), 'dueno': dueno}},
+                              upsert=True)
+    except DuplicateKeyError:
+        # Existe y no ha caducado: lo tiene otro proceso
+        return False
+    return True
+
+def liberar_bloqueo(db, nombre):
+    dueno = f"{socket.gethostname()}:{os.getpid()}"
+    db['meta'].delete_one({'_id': f'bloqueo:{nombre}', 'dueno': dueno})
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+from pymongo.errors import ServerSelectionTimeoutError
+
+import app
+import conexion
+import tareas
+
+@pytest.fixture
+def cliente(monkeypatch):
+    cliente = mongomock.MongoClient()
+    monkeypatch.setattr(conexion, 'cliente', lambda: cliente)
+    monkeypatch.setattr(conexion, 'ping', lambda: None)
+    monkeypatch.setattr(app, '_arranque', {'pendiente': False, 'intentos': 0, 'error': None})
+    return app.create_app().test_client()
+
+def test_mongo_caido_no_tumba_el_worker(cliente, monkeypatch):
+    seguir = threading.Event()
+    fallos = []
+
+    def iniciar_proceso():
+        if len(fallos) < 2:
+            fallos.append(1)
+            raise ServerSelectionTimeoutError('mongo:27017: connection refused')
+        seguir.wait(5)
+
+    monkeypatch.setattr(app, 'iniciar_proceso', iniciar_proceso)
+    monkeypatch.setattr(app.time, 'sleep', lambda segundos: None)
+    hilo = app.iniciar_en_segundo_plano()
+    respuesta = cliente.get('/readyz')
+    assert respuesta.status_code == 503
+    assert respuesta.get_json()['estado'] == 'arrancando'
+    seguir.set()
+    hilo.join(5)
+    assert app._arranque['intentos'] == 3
+    assert cliente.get('/readyz').status_code == 200
+    assert cliente.get('/healthz').status_code == 200
+
+def test_error_que_no_es_de_mongo_no_se_reintenta(cliente, monkeypatch):
+    def iniciar_proceso():
+        raise ValueError('backup corrupto')
+
+    monkeypatch.setattr(app, 'iniciar_proceso', iniciar_proceso)
+    app.iniciar_en_segundo_plano().join(5)
+    assert app._arranque['intentos'] == 1
+    respuesta = cliente.get('/readyz')
+    assert respuesta.status_code == 503
+    assert respuesta.get_json()['error'] == 'backup corrupto'
+
+def test_bloqueo_lo_retoma_su_dueno():
+    db = mongomock.MongoClient()['test_arranque']
+    assert tareas.adquirir_bloqueo(db, 'arranque')
+    # Sin liberar (p. ej. Mongo cayó antes del finally): el mismo proceso lo
+    # vuelve a tomar y otro no
+    assert tareas.adquirir_bloqueo(db, 'arranque')
+    db['meta'].update_one({'_id': 'bloqueo:arranque'}, {'$set': {'dueno': 'otro:1'}})
+    assert not tareas.adquirir_bloqueo(db, 'arranque')
@@ -0,0 +1,98 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import backup_incremental
+import cambios
+import escrituras
+
+def venta(i, producto=None):
+    return {'producto': producto or f"Producto {i % 4}", 'cantidad': i % 5 + 1,
+            'ingresos': round(10 + i * 1.5, 2), 'fecha': datetime(2024, 1 + i % 6, 1 + i % 28)}
+
+def nueva_db(nombre):
+    base = mongomock.MongoClient()[nombre]
+    cambios.crear_indices(base)
+    return base
+
+@pytest.fixture
+def db():
+    base = nueva_db('test_backup')
+    escrituras.altas(base, [venta(i) for i in range(10)])
+    return base
+
+def contenido(db):
+    return sorted((v['_id'], v['producto'], v['cantidad'], v['ingresos'], v['fecha']) for v in db['ventas'].find())
+
+def modificar(db, desde):
+    ids = [str(v['_id']) for v in db['ventas'].find({}, {'_id': 1})]
+    escrituras.altas(db, [venta(i) for i in range(desde, desde + 3)])
+    escrituras.cambio(db, ids[0], venta(desde, producto='Cambiado'))
+    escrituras.baja(db, ids[1])
+
+def test_restaurar_base_y_segmentos(db, tmp_path):
+    directorio = str(tmp_path)
+    assert backup_incremental.sincronizar(db, directorio).startswith('Snapshot base')
+    modificar(db, 100)
+    backup_incremental.sincronizar(db, directorio)
+    modificar(db, 200)
+    backup_incremental.sincronizar(db, directorio)
+    assert len(backup_incremental.segmentos(directorio)) == 2
+
+    restaurada = nueva_db('test_backup_restaurada')
+    n, aplicados = backup_incremental.restaurar(restaurada, directorio)
+    assert n == 10
+    assert aplicados == 2 * 5
+    assert contenido(restaurada) == contenido(db)
+    # La numeración de cambios sigue donde la dejó el backup
+    assert cambios.seq_actual(restaurada) == cambios.seq_actual(db)
+
+def test_sin_cambios(db, tmp_path):
+    backup_incremental.sincronizar(db, str(tmp_path))
+    assert backup_incremental.sincronizar(db, str(tmp_path)).startswith('Sin cambios')
+
+def test_hueco_reciente_espera_y_antiguo_se_salta(db, tmp_path):
+    directorio = str(tmp_path)
+    backup_incremental.sincronizar(db, directorio)
+    escrituras.alta(db, venta(50))
+    hueco = cambios._siguiente_seq(db)        # reservado y nunca escrito
+    escrituras.alta(db, venta(51))
+
+    backup_incremental.sincronizar(db, directorio)
+    assert backup_incremental.leer_estado(directorio)['seq'] == hueco - 1
+
+    # Pasado HUECO_SEGUNDOS se da por perdido y se sigue adelante
+    antiguo = datetime.utcnow() - timedelta(seconds=backup_incremental.HUECO_SEGUNDOS + 1)
+    db[cambios.COLECCION].update_many({}, {'$set': {'ts': antiguo}})
+    backup_incremental.sincronizar(db, directorio)
+    assert backup_incremental.leer_estado(directorio)['seq'] == hueco + 1
+
+    restaurada = nueva_db('test_backup_hueco')
+    backup_incremental.restaurar(restaurada, directorio)
+    assert contenido(restaurada) == contenido(db)
+
+def test_compactar(db, tmp_path, monkeypatch):
+    directorio = str(tmp_path)
+    monkeypatch.setattr(backup_incremental, 'COMPACTAR_CADA', 2)
+    backup_incremental.sincronizar(db, directorio)
+    modificar(db, 100)
+    assert backup_incremental.sincronizar(db, directorio) == "Segmento con 5 cambios."
+    modificar(db, 200)
+    assert backup_incremental.sincronizar(db, directorio).endswith('backup compactado.')
+
+    estado = backup_incremental.leer_estado(directorio)
+    assert estado['base_seq'] == estado['seq'] == cambios.seq_actual(db)
+    assert backup_incremental.segmentos(directorio) == []
+    assert not os.listdir(os.path.join(directorio, 'segmentos'))
+    assert db[cambios.COLECCION].count_documents({}) == 0
+
+    # Tras compactar se sigue añadiendo segmentos encima de la base nueva
+    modificar(db, 300)
+    backup_incremental.sincronizar(db, directorio)
+    restaurada = nueva_db('test_backup_compactada')
+    n, aplicados = backup_incremental.restaurar(restaurada, directorio)
+    assert (n, aplicados) == (14, 5)
+    assert contenido(restaurada) == contenido(db)
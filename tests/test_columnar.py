@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import backup_incremental
+import cambios
+import escrituras
+from agregados import resumen_ventas
+from columnar import InstantaneaVentas
+
+INICIO_VENTANA = datetime(2024, 3, 1)
+FIN_VENTANA = datetime(2024, 5, 1)
+
+def venta(i, producto=None, fecha=None):
+    return {'producto': producto or f"Producto {i % 4}", 'cantidad': i % 5 + 1,
+            'ingresos': round(10 + i * 1.5, 2), 'fecha': fecha or datetime(2024, 1 + i % 6, 1 + i % 28)}
+
+@pytest.fixture
+def db():
+    base = mongomock.MongoClient()['test_columnar']
+    cambios.crear_indices(base)
+    escrituras.altas(base, [venta(i) for i in range(10)])
+    return base
+
+def comprobar(instantanea, db, inicio=None, fin=None):
+    filtro = {'fecha': {k: v for k, v in (('$gte', inicio), ('$lt', fin)) if v}} if inicio or fin else {}
+    esperado = resumen_ventas(db['ventas'], filtro, 'dia')
+    obtenido = instantanea.resumen_actualizado(db, inicio, fin)
+    assert obtenido.cantidad == esperado.cantidad
+    assert obtenido.ingresos == pytest.approx(esperado.ingresos)
+    assert obtenido.ingresos_dia == pytest.approx({k.date() if isinstance(k, datetime) else k: v
+                                                   for k, v in esperado.ingresos_dia.items()})
+    assert obtenido.total_ventas == esperado.total_ventas
+    assert obtenido.total_ingresos == pytest.approx(esperado.total_ingresos)
+
+def test_igual_que_mongo(db):
+    instantanea = InstantaneaVentas()
+    instantanea.cargar(db)
+    comprobar(instantanea, db)
+    comprobar(instantanea, db, INICIO_VENTANA, FIN_VENTANA)
+
+def test_sigue_las_escrituras(db):
+    instantanea = InstantaneaVentas()
+    instantanea.cargar(db)
+    ids = [v['_id'] for v in db['ventas'].find({}, {'_id': 1}).limit(4)]
+    escrituras.baja(db, str(ids[0]))
+    escrituras.cambio(db, str(ids[1]), venta(99, producto='Nuevo', fecha=datetime(2024, 3, 9)))
+    escrituras.alta(db, venta(100, producto='Otro'))
+    comprobar(instantanea, db)
+    comprobar(instantanea, db, INICIO_VENTANA, FIN_VENTANA)
+    assert len(instantanea) == db['ventas'].count_documents({})
+
+def test_recarga_tras_compactar(db, tmp_path):
+    instantanea = InstantaneaVentas()
+    instantanea.cargar(db)
+    escrituras.altas(db, [venta(i) for i in range(10, 15)])
+    # El primer backup incremental compacta y poda todo el registro de cambios
+    backup_incremental.sincronizar(db, str(tmp_path))
+    assert db[cambios.COLECCION].count_documents({}) == 0
+    comprobar(instantanea, db)
+    assert instantanea.resumen().total_ventas == 15
@@ -0,0 +1,117 @@
+import json
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import cambios
+import conexion
+import resumen_materializado
+
+@pytest.fixture
+def db(monkeypatch):
+    cliente = mongomock.MongoClient()
+    monkeypatch.setattr(conexion, 'cliente', lambda: cliente)
+    base = conexion.obtener_db()
+    cambios.crear_indices(base)
+    resumen_materializado.crear_indices(base)
+    return base
+
+@pytest.fixture
+def cliente(db):
+    import app
+    return app.create_app().test_client()
+
+def ndjson(*filas):
+    return b''.join(f.encode() if isinstance(f, str) else f for f in filas)
+
+def enviar(cliente, cuerpo, formato='ndjson', lote=2):
+    respuesta = cliente.post(f'/api/ventas/bulk?formato={formato}&lote={lote}', data=cuerpo)
+    return respuesta.status_code, respuesta.get_json()
+
+def errores(informe):
+    return [e for l in informe['lotes'] for e in l['detalle_errores']]
+
+def test_ndjson_filas_validas(cliente, db):
+    cuerpo = ndjson('{"producto": "A", "cantidad": 2, "ingresos": 10.5, "fecha": "2024-01-02"}\n',
+                    '\n',
+                    '{"producto": "B", "cantidad": "3", "ingresos": "7", "fecha": "2024-01-03T10:00:00"}\n',
+                    '{"producto": "A", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}\n')
+    estado, informe = enviar(cliente, cuerpo)
+    assert estado == 200
+    assert informe['total_insertadas'] == 3 and informe['total_errores'] == 0
+    assert db['ventas'].count_documents({}) == 3
+    assert resumen_materializado.verificar(db) == []
+
+@pytest.mark.parametrize('linea', [
+    '{"producto": 5, "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}',
+    '{"producto": ["A"], "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}',
+    '{"producto": "  ", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}',
+    '{"producto": "A", "cantidad": 1, "ingresos": NaN}',
+    '{"producto": "A", "cantidad": 1, "ingresos": Infinity}',
+    '{"producto": "A", "cantidad": 1, "ingresos": "-inf"}',
+    '{"producto": "A", "cantidad": 1e400, "ingresos": 1, "fecha": "2024-01-05"}',
+    '{"producto": "A", "cantidad": 1, "ingresos": 1, "fecha": "ayer"}',
+    '[1, 2]',
+    '{"producto": "A",',
+])
+def test_ndjson_fila_invalida_no_rompe_la_carga(cliente, db, linea):
+    cuerpo = ndjson('{"producto": "A", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}\n', linea + '\n',
+                    '{"producto": "B", "cantidad": 1, "ingresos": 2, "fecha": "2024-01-05"}\n')
+    estado, informe = enviar(cliente, cuerpo)
+    assert estado == 200
+    assert informe['total_insertadas'] == 2
+    assert [e['fila'] for e in errores(informe)] == [2]
+    assert resumen_materializado.verificar(db) == []
+    # El JSON del dashboard sigue siendo válido (sin NaN / Infinity)
+    json.loads(cliente.get('/api/dashboard').data)
+
+def test_ndjson_utf8_no_valido_es_error_de_fila(cliente, db):
+    cuerpo = ndjson('{"producto": "A", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}\n',
+                    b'{"producto": "\xff\xfe", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}\n',
+                    '{"producto": "Café", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-05"}\n')
+    estado, informe = enviar(cliente, cuerpo)
+    assert estado == 200
+    assert informe['total_insertadas'] == 2
+    assert [e['fila'] for e in errores(informe)] == [2]
+
+def test_fecha_con_zona_se_guarda_en_utc(cliente, db):
+    cuerpo = ndjson('{"producto": "A", "cantidad": 1, "ingresos": 1, "fecha": "2024-01-01T23:30:00-05:00"}\n')
+    estado, informe = enviar(cliente, cuerpo)
+    assert estado == 200
+    assert db['ventas'].find_one()['fecha'] == datetime(2024, 1, 2, 4, 30)
+    assert db[resumen_materializado.COLECCION].find_one({'tipo': 'dia'})['clave'] == '2024-01-02'
+    assert resumen_materializado.verificar(db) == []
+
+def test_csv(cliente, db):
+    cuerpo = ('﻿producto,cantidad,ingresos,fecha\r\n'
+              'A,2,10.5,2024-01-02\r\n'
+              'B,x,1,2024-01-02\r\n'
+              'C,1,nan,2024-01-02\r\n'
+              '"D con, coma",1,3,2024-01-03\r\n').encode()
+    estado, informe = enviar(cliente, cuerpo, 'csv')
+    assert estado == 200
+    assert informe['total_insertadas'] == 2
+    assert [e['fila'] for e in errores(informe)] == [3, 4]
+
+def test_csv_utf8_no_valido_corta_la_lectura(cliente, db):
+    cuerpo = b'producto,cantidad,ingresos,fecha\nA,1,1,2024-01-05\n' + b'\xff' * 10000 + b',1,1,2024-01-05\nB,1,1,2024-01-05\n'
+    estado, informe = enviar(cliente, cuerpo, 'csv', lote=1)
+    assert estado == 200
+    assert informe['total_insertadas'] == 1
+    assert 'UTF-8' in errores(informe)[-1]['error']
+
+def test_csv_error_de_formato_es_error_de_fila(cliente, db):
+    # Campo por encima de csv.field_size_limit()
+    cuerpo = (b'producto,cantidad,ingresos,fecha\nA,1,1,2024-01-05\n' + b'B' * 200000 +
+              b',1,1,2024-01-05\nC,1,1,2024-01-05\n')
+    estado, informe = enviar(cliente, cuerpo, 'csv')
+    assert estado == 200
+    assert informe['total_insertadas'] == 2
+    assert [e['fila'] for e in errores(informe)] == [3]
+
+def test_todo_invalido_devuelve_400(cliente, db):
+    estado, informe = enviar(cliente, ndjson('{"producto": 1}\n'))
+    assert estado == 400
+    assert db['ventas'].count_documents({}) == 0
@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+import metricas
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(metricas, 'METRICAS_DIR', str(tmp_path))
+    monkeypatch.setattr(metricas, '_volcado', {'pid': None, 'fichero': None})
+    for nombre, h in metricas._HISTOGRAMAS.items():
+        monkeypatch.setattr(metricas, nombre, metricas.Histograma(h.buckets))
+    monkeypatch.setattr(metricas, '_HISTOGRAMAS', {n: getattr(metricas, n) for n in metricas._HISTOGRAMAS})
+    return tmp_path
+
+def otro_worker(directorio, pid, observaciones):
+    h = metricas.Histograma()
+    for etiquetas, valor in observaciones:
+        h.observar(etiquetas, valor)
+    with open(os.path.join(directorio, f'{pid}-1.json'), 'w') as f:
+        json.dump({'peticiones': h.volcar()}, f)
+
+def linea(texto, prefijo):
+    return next(l for l in texto.splitlines() if l.startswith(prefijo))
+
+def test_suma_los_histogramas_de_todos_los_workers(directorio):
+    metricas.peticiones.observar(('dashboard', 'GET', '200'), 0.02)
+    otro_worker(directorio, 1, [(('dashboard', 'GET', '200'), 0.3), (('gestion', 'GET', '200'), 0.001)])
+    otro_worker(directorio, 2, [(('dashboard', 'GET', '200'), 7)])
+    texto = metricas.exportar_prometheus()
+    base = 'app_peticion_segundos'
+    etiquetas = 'ruta="dashboard",metodo="GET",estado="200"'
+    assert linea(texto, f'{base}_count{{{etiquetas}}}').endswith(' 3')
+    assert linea(texto, f'{base}_bucket{{{etiquetas},le="0.025"}}').endswith(' 1')
+    assert linea(texto, f'{base}_bucket{{{etiquetas},le="0.5"}}').endswith(' 2')
+    assert float(linea(texto, f'{base}_sum{{{etiquetas}}}').split()[-1]) == pytest.approx(7.32)
+    assert linea(texto, f'{base}_count{{ruta="gestion"').endswith(' 1')
+    # El propio proceso ha dejado su fichero para los demás
+    assert len(list(directorio.glob('*.json'))) == 3
+
+def test_ignora_ficheros_a_medias(directorio):
+    (directorio / '9-1.json').write_text('{"peticiones": [[')
+    metricas.peticiones.observar(('dashboard', 'GET', '200'), 0.02)
+    assert linea(metricas.exportar_prometheus(), 'app_peticion_segundos_count').endswith(' 1')
+
+def test_limpiar_directorio(directorio):
+    otro_worker(directorio, 1, [(('dashboard', 'GET', '200'), 0.3)])
+    metricas.limpiar_directorio()
+    assert list(directorio.iterdir()) == []
@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+from pareto import UMBRAL_NUMPY, calcular_pareto, indice_corte, ordenar_por_valor, truncar_top_n
+
+# --- IMPLEMENTACIÓN ANTERIOR (app.py original) ---
+# Referencia con la que se compara el módulo nuevo.
+
+def pareto_anterior(ingresos_por_prod):
+    sorted_par = sorted(ingresos_por_prod.items(), key=lambda x: x[1], reverse=True)
+    prods_par = [x[0] for x in sorted_par]
+    ingr_par = [x[1] for x in sorted_par]
+    total = sum(ingr_par)
+    acumulado = [sum(ingr_par[:i+1])/total*100 for i in range(len(ingr_par))]
+    return prods_par, ingr_par, acumulado
+
+def preparar_datos_tarta(ventas):
+    agrupado = {}
+    for v in ventas:
+        prod = v['producto']
+        agrupado[prod] = agrupado.get(prod, 0) + v['ingresos']
+    lista_ordenada = sorted(agrupado.items(), key=lambda x: x[1], reverse=True)
+
+    if len(lista_ordenada) > 5:
+        top_5 = lista_ordenada[:5]
+        otros_valor = sum(item[1] for item in lista_ordenada[5:])
+        top_5.append(('Otros', otros_valor))
+        labels = [x[0] for x in top_5]
+        values = [x[1] for x in top_5]
+    else:
+        labels = [x[0] for x in lista_ordenada]
+        values = [x[1] for x in lista_ordenada]
+    return labels, values
+
+def corte_anterior(acumulado, umbral=80.0):
+    for i, porcentaje in enumerate(acumulado):
+        if porcentaje >= umbral:
+            return i
+    return len(acumulado)
+
+def ingresos_aleatorios(n, semilla=1, empates=False):
+    rnd = random.Random(semilla)
+    if empates:
+        # Pocos valores distintos: muchos productos empatados
+        return {f"Producto {i}": float(rnd.choice([10, 20, 20, 50])) for i in range(n)}
+    return {f"Producto {i}": round(rnd.uniform(1, 1000), 2) for i in range(n)}
+
+# --- PARETO ---
+
+@pytest.mark.parametrize('n', [1, 2, 5, 6, 50, 300])
+@pytest.mark.parametrize('empates', [False, True])
+def test_pareto_igual_que_antes(n, empates):
+    ingresos = ingresos_aleatorios(n, semilla=n, empates=empates)
+    datos = calcular_pareto(ingresos)
+    productos, valores, acumulado = pareto_anterior(ingresos)
+    assert datos['productos'] == productos
+    assert datos['ingresos'] == valores
+    assert datos['acumulado'] == pytest.approx(acumulado)
+    assert datos['corte'] == corte_anterior(acumulado)
+
+def test_pareto_catalogo_grande_con_numpy():
+    pytest.importorskip('numpy')
+    ingresos = ingresos_aleatorios(UMBRAL_NUMPY + 10)
+    datos = calcular_pareto(ingresos)
+    productos, valores, acumulado = pareto_anterior(ingresos)
+    assert datos['productos'] == productos
+    assert datos['acumulado'] == pytest.approx(acumulado)
+    assert datos['corte'] == corte_anterior(acumulado)
+
+def test_pareto_sin_ingresos():
+    datos = calcular_pareto({'A': 0, 'B': 0})
+    assert datos['productos'] == ['A', 'B']
+    assert datos['acumulado'] == [0.0, 0.0]
+    assert datos['corte'] == 2
+
+def test_pareto_vacio():
+    assert calcular_pareto({}) == {'productos': [], 'ingresos': [], 'acumulado': [], 'corte': 0}
+
+@pytest.mark.parametrize('umbral', [0, 50, 80, 99.9, 100])
+def test_indice_corte(umbral):
+    _, _, acumulado = pareto_anterior(ingresos_aleatorios(40, empates=True))
+    assert indice_corte(acumulado, umbral) == corte_anterior(acumulado, umbral)
+
+# --- TARTA (TOP 5 + 'Otros') ---
+
+@pytest.mark.parametrize('n', [0, 1, 4, 5, 6, 30])
+@pytest.mark.parametrize('empates', [False, True])
+def test_top_n_igual_que_tarta_anterior(n, empates):
+    rnd = random.Random(n)
+    ventas = [{'producto': f"Producto {rnd.randrange(max(n, 1))}",
+               'ingresos': float(rnd.choice([10, 20])) if empates else round(rnd.uniform(1, 100), 2)}
+              for _ in range(n * 3)]
+    agrupado = {}
+    for v in ventas:
+        agrupado[v['producto']] = agrupado.get(v['producto'], 0) + v['ingresos']
+    top = truncar_top_n(ordenar_por_valor(agrupado), 5)
+    labels, values = preparar_datos_tarta(ventas)
+    assert [x[0] for x in top] == labels
+    assert [x[1] for x in top] == pytest.approx(values)
+
+# --- TOP N + 'Otros' EN EL PARETO ---
+
+@pytest.mark.parametrize('n', [3, 15, 16, 40, 3000])
+def test_pareto_truncado(n):
+    top_n = 15
+    ingresos = ingresos_aleatorios(n, semilla=n)
+    completo = calcular_pareto(ingresos)
+    datos = calcular_pareto(ingresos, top_n=top_n)
+    if n <= top_n:
+        assert datos == completo
+        return
+    assert datos['productos'] == completo['productos'][:top_n] + ['Otros']
+    assert datos['ingresos'][:top_n] == completo['ingresos'][:top_n]
+    assert datos['ingresos'][-1] == pytest.approx(sum(completo['ingresos'][top_n:]))
+    # La curva se calcula sobre la serie completa y termina en el 100%
+    assert datos['acumulado'][:top_n] == completo['acumulado'][:top_n]
+    assert datos['acumulado'][-1] == pytest.approx(100)
+    assert datos['corte'] == min(completo['corte'], top_n)
+
+def test_pareto_truncado_sin_ingresos():
+    datos = calcular_pareto({f"P{i}": 0 for i in range(10)}, top_n=3)
+    assert datos['productos'] == ['P0', 'P1', 'P2', 'Otros']
+    assert datos['acumulado'] == [0.0] * 4
+    assert datos['corte'] == 3
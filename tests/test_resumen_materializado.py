@@ -0,0 +1,70 @@
+import random
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import cambios
+import escrituras
+import resumen_materializado
+
+def venta(i, producto=None, fecha=None):
+    return {'producto': producto or f"Producto {i % 4}", 'cantidad': i % 5 + 1,
+            'ingresos': round(10 + i * 1.5, 2), 'fecha': fecha or datetime(2024, 1 + i % 6, 1 + i % 28, 12)}
+
+@pytest.fixture
+def db():
+    base = mongomock.MongoClient()['test_resumen']
+    cambios.crear_indices(base)
+    resumen_materializado.crear_indices(base)
+    return base
+
+def ids(db):
+    return [str(v['_id']) for v in db['ventas'].find({}, {'_id': 1})]
+
+def test_alta_y_altas(db):
+    escrituras.alta(db, venta(0))
+    escrituras.altas(db, [venta(i) for i in range(1, 20)])
+    assert resumen_materializado.verificar(db) == []
+
+def test_cambio_de_cifras_producto_y_dia(db):
+    escrituras.altas(db, [venta(i) for i in range(10)])
+    primero, segundo, tercero = ids(db)[:3]
+    escrituras.cambio(db, primero, dict(venta(0), cantidad=50, ingresos=999.5))
+    # Mover una venta a otro producto (que aún no existe) y a otro día
+    escrituras.cambio(db, segundo, venta(1, producto='Nuevo'))
+    escrituras.cambio(db, tercero, venta(2, fecha=datetime(2023, 12, 31, 23, 59)))
+    assert resumen_materializado.verificar(db) == []
+    # El producto/día que se queda sin ventas desaparece del resumen
+    claves = {(d['tipo'], d['clave']) for d in db[resumen_materializado.COLECCION].find()}
+    assert ('producto', 'Nuevo') in claves
+    assert all(d['ventas'] > 0 for d in db[resumen_materializado.COLECCION].find({'tipo': {'$ne': 'global'}}))
+
+def test_baja(db):
+    escrituras.altas(db, [venta(i, producto='Único' if i == 0 else None) for i in range(8)])
+    for venta_id in ids(db)[:3]:
+        escrituras.baja(db, venta_id)
+    assert resumen_materializado.verificar(db) == []
+    assert db[resumen_materializado.COLECCION].find_one({'tipo': 'producto', 'clave': 'Único'}) is None
+
+def test_secuencia_aleatoria(db):
+    rnd = random.Random(7)
+    escrituras.altas(db, [venta(i) for i in range(20)])
+    for i in range(150):
+        existentes = ids(db)
+        op = rnd.random()
+        if op < 0.3 or not existentes:
+            escrituras.alta(db, venta(rnd.randrange(1000)))
+        elif op < 0.4:
+            escrituras.altas(db, [venta(rnd.randrange(1000)) for _ in range(rnd.randint(1, 5))])
+        elif op < 0.75:
+            escrituras.cambio(db, rnd.choice(existentes), venta(rnd.randrange(1000)))
+        else:
+            escrituras.baja(db, rnd.choice(existentes))
+    assert resumen_materializado.verificar(db) == []
+
+def test_verificar_detecta_descuadres(db):
+    escrituras.altas(db, [venta(i) for i in range(5)])
+    db[resumen_materializado.COLECCION].update_one({'tipo': 'global'}, {'$inc': {'ingresos': 1}})
+    assert [clave for clave, _, _ in resumen_materializado.verificar(db)] == [('global', None)]
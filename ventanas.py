@@ -0,0 +1,108 @@
+from datetime import datetime, time, timedelta
+
+# --- VENTANAS DE TIEMPO ---
+# Traduce los parámetros de la URL (tiempo=<preset> o desde/hasta) a un rango
+# [inicio, fin) sobre 'fecha', que Mongo resuelve con el índice de fecha: solo
+# salen de la base de datos las ventas de la ventana. Los límites van a día
+# completo, así que la misma ventana da la misma clave de caché todo el día.
+
+PRESETS = {'7dias': 7, '30dias': 30, '90dias': 90, '365dias': 365}   # últimos N días, hoy incluido
+GRANULARIDADES = ('dia', 'semana', 'mes')
+
+class VentanaInvalida(ValueError):
+    pass
+
+def _dia(valor, campo):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise VentanaInvalida(f"Fecha no válida en '{campo}': {valor!r} (formato AAAA-MM-DD)")
+
+def truncar(dia, granularidad):
+    # Inicio del periodo (lunes para semanas, día 1 para meses) de un date
+    if granularidad == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if granularidad == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+def granularidad_para(dias):
+    # Serie temporal de unos cientos de puntos como mucho
+    if dias <= 92:
+        return 'dia'
+    if dias <= 731:
+        return 'semana'
+    return 'mes'
+
+class Ventana:
+
+    def __init__(self, nombre='todo', inicio=None, fin=None):
+        self.nombre = nombre
+        self.inicio = inicio   # incluido
+        self.fin = fin         # excluido
+
+    @classmethod
+    def desde_args(cls, args, hoy=None):
+        desde, hasta = args.get('desde'), args.get('hasta')
+        if desde or hasta:
+            inicio = _dia(desde, 'desde') if desde else None
+            fin = _dia(hasta, 'hasta') + timedelta(days=1) if hasta else None
+            if inicio and fin and inicio >= fin:
+                raise VentanaInvalida("'desde' es posterior a 'hasta'")
+            return cls('rango', inicio, fin)
+
+        hoy = datetime.combine(hoy or datetime.now().date(), time())
+        tiempo = args.get('tiempo', 'todo')
+        if tiempo in PRESETS:
+            return cls(tiempo, hoy - timedelta(days=PRESETS[tiempo] - 1))
+        if tiempo == 'mes':
+            return cls(tiempo, hoy.replace(day=1))
+        if tiempo == 'anio':
+            return cls(tiempo, hoy.replace(month=1, day=1))
+        # Valor desconocido: histórico completo, como hasta ahora
+        return cls()
+
+    def es_todo(self):
+        return self.inicio is None and self.fin is None
+
+    def relativa(self):
+        # Se mueve con el calendario aunque nadie escriba en 'ventas'
+        return self.nombre in PRESETS or self.nombre in ('mes', 'anio')
+
+    def filtro(self):
+        rango = {}
+        if self.inicio:
+            rango['$gte'] = self.inicio
+        if self.fin:
+            rango['$lt'] = self.fin
+        return {'fecha': rango} if rango else {}
+
+    def clave(self):
+        return (self.inicio, self.fin)
+
+    def args(self):
+        # Parámetros de URL que reproducen esta ventana
+        if self.nombre != 'rango':
+            return {'tiempo': self.nombre}
+        args = {}
+        if self.inicio:
+            args['desde'] = self.inicio.strftime('%Y-%m-%d')
+        if self.fin:
+            args['hasta'] = (self.fin - timedelta(days=1)).strftime('%Y-%m-%d')
+        return args
+
+    def descripcion(self):
+        if self.es_todo():
+            return 'todo'
+        desde = self.inicio.strftime('%Y-%m-%d') if self.inicio else '…'
+        hasta = (self.fin - timedelta(days=1)).strftime('%Y-%m-%d') if self.fin else 'hoy'
+        return f"{desde} a {hasta}"
+
+    def granularidad(self, pedida='auto', hoy=None):
+        # None si depende de los datos (auto sin inicio conocido)
+        if pedida in GRANULARIDADES:
+            return pedida
+        if self.inicio is None:
+            return None
+        fin = self.fin or datetime.combine((hoy or datetime.now().date()) + timedelta(days=1), time())
+        return granularidad_para((fin - self.inicio).days)